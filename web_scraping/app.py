@@ -4,19 +4,33 @@ Email Campaign Web Interface
 Flask-based web application for bulk email campaigns
 """
 
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, Response, render_template, request, session, redirect, url_for
 import os
 import csv
+import hashlib
 import json
+import logging
+import mimetypes
+import re
 import time
+import queue
 import threading
-from datetime import datetime
+import uuid
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
-from email_config import get_template, CAMPAIGN_SETTINGS
-from simple_email_sender import send_email_smtp
+from email_config import get_template, compile_template, CAMPAIGN_SETTINGS
+from simple_email_sender import build_parts, prepare_parts, build_message_text, Campaign, SentLog, SMTPSession, TokenBucket
 from docx import Document
 
+try:
+    import orjson  # Faster JSON for the frequently polled status endpoints
+except ImportError:
+    orjson = None
+
 # Load environment variables
 load_dotenv()
 
@@ -25,9 +39,11 @@ app.secret_key = os.getenv('SECRET_KEY', 'your-secret-key-change-this')
 
 # Configuration
 UPLOAD_FOLDER = 'uploads'
-ALLOWED_EXTENSIONS = {'csv', 'docx', 'doc'}
-ALLOWED_ATTACHMENT_EXTENSIONS = {'pdf', 'doc', 'docx', 'txt', 'jpg', 'jpeg', 'png', 'gif', 'xlsx', 'xls', 'zip', 'rar', '7z'}
+ALLOWED_EXTENSIONS = frozenset({'csv', 'docx', 'doc'})
+ALLOWED_ATTACHMENT_EXTENSIONS = frozenset({'pdf', 'doc', 'docx', 'txt', 'jpg', 'jpeg', 'png', 'gif', 'xlsx', 'xls', 'zip', 'rar', '7z'})
 MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+PREVIEW_ROWS = 50  # Contacts returned to the UI after a CSV upload
+HTML_PLACEHOLDER_PATTERN = re.compile(r'\{(name|sender_name|company_name)\}')
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
@@ -35,6 +51,8 @@ app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 # Create uploads directory
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+MAX_LOGS = 50  # Keep only the last 50 log entries
+
 # Global campaign state
 campaign_status = {
     'running': False,
@@ -43,22 +61,69 @@ campaign_status = {
     'failed': 0,
     'current_email': '',
     'progress': 0,
-    'logs': []
+    'logs': deque(maxlen=MAX_LOGS)
 }
+status_lock = threading.Lock()  # Guards counters and logs, updated from worker threads
+campaign_lock = threading.Lock()  # Held for the lifetime of a campaign so only one runs at a time
+status_changed = threading.Condition()  # Wakes /events streams when the status changes
+EVENTS_TIMEOUT = 15  # Seconds between /events pushes when nothing changes
+
+# Optional Celery backend: set CELERY_BROKER_URL (plus REDIS_URL if the broker is not Redis)
+# to run campaigns on a Celery worker instead of an in-process thread. Status is then shared
+# through Redis so every web worker and restart sees the same campaign.
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL')
+REDIS_URL = os.getenv('REDIS_URL', CELERY_BROKER_URL)
+STATUS_KEY = 'campaign:status'  # Hash of the scalar status fields
+LOGS_KEY = 'campaign:logs'  # List of JSON log entries, newest first, capped at MAX_LOGS
+LOCK_KEY = 'campaign:lock'
+# Deletes the lock only if it still holds this campaign's token, in one atomic step
+RELEASE_LOCK_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+CAMPAIGN_LOCK_TTL = 24 * 60 * 60  # Frees the slot if a worker dies without releasing it
+RUNNING_CHECK_SECONDS = 1  # How long is_running trusts its last read of the Redis running flag
+
+celery = None
+redis_client = None
+if CELERY_BROKER_URL:
+    from celery import Celery
+    import redis
+    
+    celery = Celery(__name__, broker=CELERY_BROKER_URL)
+    celery.conf.task_default_queue = 'emails'
+    redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+
+def dumps(obj):
+    """Serialize to UTF-8 JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode()
+
+def ojson(obj):
+    """JSON response built with dumps() instead of Flask's default encoder"""
+    return Response(dumps(obj), mimetype='application/json')
+
+def notify_status_changed():
+    """Wake any /events streams waiting for a status change"""
+    with status_changed:
+        status_changed.notify_all()
+
+def file_extension(filename):
+    """Lower-cased extension without the dot ('' if there is none)"""
+    return os.path.splitext(filename)[1][1:].lower()
 
 def allowed_file(filename):
     """Check if file extension is allowed"""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    return file_extension(filename) in ALLOWED_EXTENSIONS
 
 def allowed_attachment_file(filename):
     """Check if attachment file extension is allowed"""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_ATTACHMENT_EXTENSIONS
+    return file_extension(filename) in ALLOWED_ATTACHMENT_EXTENSIONS
 
 def read_doc_file(filepath):
     """Read content from DOC/DOCX file and extract images with formatting"""
     try:
         doc = Document(filepath)
         html_content = []
+        plain_parts = []
         images = []
         
         # Extract content with formatting
@@ -79,17 +144,30 @@ def read_doc_file(filepath):
                 paragraph_html = ''.join(runs_html)
                 if paragraph_html.strip():
                     html_content.append(f'<p>{paragraph_html}</p>')
+                    plain_parts.append(paragraph.text)
         
         # Extract images if any
         for rel in doc.part.rels.values():
             if "image" in rel.target_ref:
                 try:
                     image_data = rel.target_part.blob
-                    image_filename = f"image_{len(images)}.png"
+                    # Name images by content hash so identical images are stored once
+                    digest = hashlib.blake2b(image_data, digest_size=16).hexdigest()
+                    # Keep the image's real type so it is attached with the matching content type
+                    extension = (mimetypes.guess_extension(rel.target_part.content_type)
+                                 or os.path.splitext(rel.target_ref)[1].lower() or '.bin')
+                    image_filename = f"{digest}{extension}"
                     image_path = os.path.join(app.config['UPLOAD_FOLDER'], image_filename)
+                    if image_path in images:
+                        continue
                     
-                    with open(image_path, 'wb') as f:
-                        f.write(image_data)
+                    try:
+                        fd = os.open(image_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+                    except FileExistsError:
+                        pass  # Already extracted by an earlier upload
+                    else:
+                        with os.fdopen(fd, 'wb') as f:
+                            f.write(image_data)
                     
                     images.append(image_path)
                     # Add image to HTML content
@@ -113,8 +191,8 @@ def read_doc_file(filepath):
         </html>
         '''
         
-        # Also create plain text version
-        plain_text = '\n\n'.join([p.replace('<p>', '').replace('</p>', '').replace('<strong>', '').replace('</strong>', '').replace('<em>', '').replace('</em>', '').replace('<u>', '').replace('</u>', '') for p in html_content])
+        # Plain text version, collected alongside the HTML paragraphs
+        plain_text = '\n\n'.join(plain_parts)
         
         return {
             'text': plain_text,
@@ -124,39 +202,150 @@ def read_doc_file(filepath):
     except Exception as e:
         raise Exception(f"Error reading DOC file: {str(e)}")
 
+def count_csv_rows(filepath):
+    """Count data rows in a CSV with a cheap line scan instead of parsing it"""
+    with open(filepath, 'rb') as f:
+        lines = sum(1 for line in f if line.strip())
+    return max(lines - 1, 0)  # Minus the header row
+
+def column_index(header, column):
+    """Position of a CSV column in the header row, or None if it is missing"""
+    try:
+        return header.index(column)
+    except ValueError:
+        return None
+
+def row_value(row, index, default):
+    """Value at a column position, or the default if the column or cell is missing"""
+    if index is None or index >= len(row):
+        return default
+    return row[index]
+
 def log_message(message, level='info'):
     """Add log message to campaign status"""
-    timestamp = datetime.now().strftime('%H:%M:%S')
-    campaign_status['logs'].append({
+    timestamp = time.strftime('%H:%M:%S')
+    entry = {
         'timestamp': timestamp,
         'message': message,
         'level': level
-    })
-    # Keep only last 50 logs
-    if len(campaign_status['logs']) > 50:
-        campaign_status['logs'] = campaign_status['logs'][-50:]
+    }
+    with status_lock:
+        campaign_status['logs'].append(entry)
+    if redis_client is not None:
+        with redis_client.pipeline() as pipe:
+            pipe.lpush(LOGS_KEY, dumps(entry))
+            pipe.ltrim(LOGS_KEY, 0, MAX_LOGS - 1)
+            pipe.execute()
+    notify_status_changed()
+
+def status_snapshot():
+    """Copy of campaign status that is safe to serialize while workers keep logging"""
+    with status_lock:
+        status = dict(campaign_status)
+        status['logs'] = list(campaign_status['logs'])
+    return status
+
+def acquire_campaign():
+    """Claim the single campaign slot; returns a token for release_campaign, or None if a campaign holds it"""
+    token = uuid.uuid4().hex
+    if redis_client is not None:
+        return token if redis_client.set(LOCK_KEY, token, nx=True, ex=CAMPAIGN_LOCK_TTL) else None
+    return token if campaign_lock.acquire(blocking=False) else None
+
+def release_campaign(token):
+    """Free the campaign slot once the campaign that acquired it with ``token`` has finished"""
+    if redis_client is not None:
+        # A run that outlived the lock's TTL must not free a slot a later campaign now holds
+        redis_client.eval(RELEASE_LOCK_SCRIPT, 1, LOCK_KEY, token)
+    elif campaign_lock.locked():
+        campaign_lock.release()
+
+def publish_counters():
+    """Mirror the campaign's counters to Redis when campaigns run on Celery; logs go through log_message"""
+    if redis_client is not None:
+        with status_lock:
+            counters = {key: value for key, value in campaign_status.items() if key not in ('running', 'logs')}
+        redis_client.hset(STATUS_KEY, mapping={key: dumps(value) for key, value in counters.items()})
 
-def send_campaign_emails(csv_file, custom_subject, custom_body, attachments=None, embedded_images=None, html_content=None):
-    """Send campaign emails in background thread"""
+def set_running(running):
+    """Set the running flag locally and, when using Celery, in Redis"""
+    campaign_status['running'] = running
+    if redis_client is not None:
+        redis_client.hset(STATUS_KEY, 'running', json.dumps(running))
+    notify_status_changed()
+
+_running_check = threading.local()  # Per thread: .timestamp, time.monotonic() of its last Redis read
+
+def is_running():
+    """Check the running flag; with Celery this sees stops requested from any web worker"""
+    if redis_client is not None:
+        # Called for every contact, so each thread reads Redis at most once per RUNNING_CHECK_SECONDS
+        now = time.monotonic()
+        if now - getattr(_running_check, 'timestamp', 0.0) >= RUNNING_CHECK_SECONDS:
+            campaign_status['running'] = json.loads(redis_client.hget(STATUS_KEY, 'running') or 'false')
+            _running_check.timestamp = now
+    return campaign_status['running']
+
+def read_status():
+    """Get the current campaign status, from Redis when campaigns run on Celery"""
+    status = status_snapshot()
+    if redis_client is None:
+        return status
+    status.update({key: json.loads(value) for key, value in redis_client.hgetall(STATUS_KEY).items()})
+    status['logs'] = [json.loads(entry) for entry in reversed(redis_client.lrange(LOGS_KEY, 0, -1))]
+    return status
+
+class WebCampaign(Campaign):
+    """Campaign whose counts, logs and stop flag are the web status page's"""
+
+    def __init__(self, sent_log):
+        super().__init__(sent_log, counts=campaign_status, lock=status_lock)
+
+    def log(self, message, level='info'):
+        log_message(message, level)
+
+    def stopped(self):
+        return not is_running()
+
+    def stop(self, reason):
+        log_message(reason, 'error')
+        set_running(False)
+
+    def progress(self, done):
+        campaign_status['progress'] = min(100, (done / max(campaign_status['total'], 1)) * 100)
+
+    def record(self, email, error=None):
+        success = super().record(email, error)
+        publish_counters()
+        return success
+
+    def skip_sent(self, contact):
+        # Already-sent contacts drop out of the total, so progress still ends at 100%
+        with self.lock:
+            self.skipped['sent'] += 1
+            campaign_status['total'] -= 1
+
+def send_campaign_emails(csv_file, custom_subject, custom_body, attachments=None, embedded_images=None, html_content=None,
+                         rate_per_min=CAMPAIGN_SETTINGS['rate_per_min'], burst=CAMPAIGN_SETTINGS['burst'],
+                         concurrency=CAMPAIGN_SETTINGS['concurrency'], lock_token=None):
+    """Send campaign emails in background thread, releasing the campaign slot held by ``lock_token`` when done"""
     global campaign_status
     
     try:
-        # Read CSV file
-        contacts = []
-        with open(csv_file, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            contacts = list(reader)
+        # Count rows up front; contacts are streamed from the file while sending
+        total = count_csv_rows(csv_file)
         
-        campaign_status['total'] = len(contacts)
+        campaign_status['total'] = total
         campaign_status['sent'] = 0
         campaign_status['failed'] = 0
-        campaign_status['running'] = True
+        publish_counters()
+        set_running(True)
         
-        log_message(f"Starting campaign with {len(contacts)} contacts", 'info')
+        log_message(f"Starting campaign with {total} contacts", 'info')
         if attachments:
             log_message(f"Attachments: {len(attachments)} files", 'info')
         if embedded_images:
-            log_message(f"Embedded images: {len(embedded_images)} files", 'info')
+            log_message(f"Embedded images: {len(embedded_images)} files: {[os.path.basename(img) for img in embedded_images]}", 'info')
         if html_content:
             log_message(f"Using HTML content from DOC file", 'info')
         
@@ -166,84 +355,150 @@ def send_campaign_emails(csv_file, custom_subject, custom_body, attachments=None
         
         if not sender_password:
             log_message("Gmail App Password not found in .env file", 'error')
-            campaign_status['running'] = False
+            set_running(False)
             return
         
-        # Send emails
-        for i, contact in enumerate(contacts, 1):
-            if not campaign_status['running']:
-                log_message("Campaign stopped by user", 'warning')
-                break
-                
-            email = contact.get('email', '').strip()
-            name = contact.get('name', 'there').strip()
-            sender_name = contact.get('sender_name', 'Raushan').strip()  # Get from Excel file
-            
+        # Pace sends with a token bucket instead of a fixed delay
+        bucket = TokenBucket(rate_per_min, burst)
+        
+        concurrency = max(1, int(concurrency))
+        
+        # Log roughly 100 progress lines per campaign; failures are always logged
+        log_every = max(1, total // 100)
+        
+        # Parse the subject/body templates once for the whole campaign
+        render_subject = compile_template(custom_subject)
+        render_body = compile_template(custom_body)
+        
+        # Images and attachments are read, base64-encoded and serialized once, then shared by every message
+        prepared = prepare_parts(build_parts(attachments, embedded_images))
+        
+        # Plain-text bodies with embedded images share the same HTML wrapper for every recipient
+        html_prefix = '<html><body style="font-family: Arial, sans-serif; line-height: 1.6;">'
+        html_suffix = ''.join([
+            f'<br><img src="cid:{os.path.basename(image_path)}" style="max-width: 100%; height: auto; display: block; margin: 10px 0;"><br>'
+            for image_path in embedded_images or []
+        ] + ['</body></html>'])
+        
+        def render_one(email, name, sender_name):
+            """Personalize one contact's email; returns its wire-format bytes, or None on a template error"""
             # Create subject and body with custom template
+            context = {
+                'name': name,
+                'sender_name': sender_name,
+                'company_name': "Nolon AI"
+            }
             try:
-                subject = custom_subject.format(
-                    name=name,
-                    sender_name=sender_name,
-                    company_name="Nolon AI"
-                )
-                
-                body = custom_body.format(
-                    name=name,
-                    sender_name=sender_name,
-                    company_name="Nolon AI"
-                )
+                subject = render_subject(context)
+                body = render_body(context)
             except KeyError as e:
                 log_message(f"Template placeholder error: {e}", 'error')
-                campaign_status['failed'] += 1
-                continue
+                return None
             
             # Create HTML body
             html_body = None
             if html_content:
-                # Use HTML content from DOC file and replace placeholders
-                html_body = html_content
-                html_body = html_body.replace('{name}', name)
-                html_body = html_body.replace('{sender_name}', sender_name)
-                html_body = html_body.replace('{company_name}', 'Nolon AI')
+                # Use HTML content from DOC file and replace placeholders in one pass
+                # (str.format can't be used: the HTML's CSS rules contain braces)
+                html_body = HTML_PLACEHOLDER_PATTERN.sub(lambda match: context[match.group(1)], html_content)
             elif embedded_images:
-                # Convert plain text to HTML
-                html_body = f'<html><body style="font-family: Arial, sans-serif; line-height: 1.6;">'
-                html_body += body.replace('\n', '<br>')
-                
-                # Add images after the text
-                for j, image_path in enumerate(embedded_images):
-                    image_filename = os.path.basename(image_path)
-                    html_body += f'<br><img src="cid:{image_filename}" style="max-width: 100%; height: auto; display: block; margin: 10px 0;"><br>'
-                
-                html_body += '</body></html>'
-            
-            campaign_status['current_email'] = email
-            campaign_status['progress'] = (i / len(contacts)) * 100
+                # Convert plain text to HTML, with the images after the text
+                html_body = ''.join((html_prefix, body.replace('\n', '<br>'), html_suffix))
             
-            log_message(f"Sending email {i}/{len(contacts)} to {email}", 'info')
-            if embedded_images:
-                log_message(f"Embedding {len(embedded_images)} images: {[os.path.basename(img) for img in embedded_images]}", 'info')
+            # Splice in the shared images and attachments
+            return build_message_text(email, subject, body, sender_email, html_body, prepared)
+        
+        def send_one(i, email, text, smtp):
+            """Send one prepared email over a worker's SMTP session"""
+            with status_lock:
+                campaign_status['current_email'] = email
             
-            # Send email with attachments and embedded images
-            success = send_email_smtp(email, subject, body, sender_email, sender_password, attachments, html_body, embedded_images)
+            verbose = i % log_every == 0
+            if verbose:
+                log_message(f"Sending email {i}/{total} to {email}", 'info')
             
-            if success:
-                campaign_status['sent'] += 1
+            bucket.acquire()
+            error = None
+            try:
+                smtp.sendmail(sender_email, email, text)
+            except Exception as e:
+                error = e
+            if campaign.record(email, error) and verbose:
                 log_message(f"✅ Email sent to {email}", 'success')
-            else:
-                campaign_status['failed'] += 1
-                log_message(f"❌ Failed to send to {email}", 'error')
+        
+        def worker(smtp):
+            """Send queued messages over this worker's own SMTP session until told to stop"""
+            while True:
+                job = jobs.get()
+                if job is None:
+                    return
+                if not is_running():
+                    continue  # Drain the queue without sending after a stop
+                try:
+                    send_one(*job, smtp)
+                except Exception as e:
+                    log_message(f"Worker error: {str(e)}", 'error')
+                    with status_lock:
+                        campaign_status['failed'] += 1
+        
+        def contacts(reader):
+            """(email, name, sender_name) for each CSV row, with the columns resolved once from the header"""
+            header = next(reader, [])
+            email_index = column_index(header, 'email')
+            name_index = column_index(header, 'name')
+            sender_name_index = column_index(header, 'sender_name')  # Get from Excel file
+            for row in reader:
+                if not row:
+                    continue  # Blank line
+                yield (row_value(row, email_index, '').strip(),
+                       row_value(row, name_index, 'there').strip(),
+                       row_value(row, sender_name_index, 'Raushan').strip())
+        
+        # Send emails over a pool of persistent SMTP connections, one per worker
+        jobs = queue.Queue(maxsize=concurrency * 2)
+        with open(csv_file, 'r', encoding='utf-8', newline='') as file, ExitStack() as stack:
+            # Contacts an interrupted run of the same file and message already reached are skipped;
+            # editing the body, HTML or attachments makes it a new campaign that sends to everyone
+            content = hashlib.blake2b(digest_size=16)
+            for chunk in (custom_subject.encode(), custom_body.encode(), (html_content or '').encode()) + prepared.texts:
+                content.update(len(chunk).to_bytes(8, 'big') + chunk)
+            sent_log = SentLog(f'{os.path.abspath(csv_file)}:{content.hexdigest()}')
+            stack.callback(sent_log.close)
+            if sent_log:
+                log_message(f"Resuming campaign: {len(sent_log)} contacts already sent", 'info')
+            campaign = WebCampaign(sent_log)
+            sessions = [stack.enter_context(SMTPSession(sender_email, sender_password)) for _ in range(concurrency)]
+            log_message(f"Sending with {concurrency} parallel SMTP connections", 'info')
             
-            # Delay between emails
-            if i < len(contacts):
-                time.sleep(5)
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                futures = [executor.submit(worker, smtp) for smtp in sessions]
+                
+                # Messages are built here, so the workers only wait on the network
+                for job in campaign.jobs(contacts(csv.reader(file)), lambda contact: render_one(*contact)):
+                    jobs.put(job)
+                if not is_running():
+                    log_message("Campaign stopped by user", 'warning')
+                
+                for _ in futures:
+                    jobs.put(None)
+                for future in as_completed(futures):
+                    future.result()
+            
+            # Still running means every row was handled without a stop; a rerun starts over
+            campaign.finish(read_all=True)
         
+        publish_counters()
         log_message(f"Campaign completed! Sent: {campaign_status['sent']}, Failed: {campaign_status['failed']}", 'info')
         
     except Exception as e:
         log_message(f"Campaign error: {str(e)}", 'error')
     finally:
-        campaign_status['running'] = False
+        set_running(False)
+        release_campaign(lock_token)
+
+if celery is not None:
+    # Worker: celery -A app.celery worker -Q emails
+    send_campaign_emails_task = celery.task(name='send_campaign_emails')(send_campaign_emails)
 
 @app.route('/')
 def index():
@@ -254,11 +509,11 @@ def index():
 def upload_file():
     """Handle CSV file upload"""
     if 'file' not in request.files:
-        return jsonify({'error': 'No file uploaded'}), 400
+        return ojson({'error': 'No file uploaded'}), 400
     
     file = request.files['file']
     if file.filename == '':
-        return jsonify({'error': 'No file selected'}), 400
+        return ojson({'error': 'No file selected'}), 400
     
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
@@ -266,12 +521,12 @@ def upload_file():
         file.save(filepath)
         
         # Check if it's a DOC file
-        file_ext = filename.rsplit('.', 1)[1].lower()
+        file_ext = file_extension(filename)
         if file_ext in ['docx', 'doc']:
             # Read DOC file content
             try:
                 doc_content = read_doc_file(filepath)
-                return jsonify({
+                return ojson({
                     'success': True,
                     'filename': filename,
                     'file_type': 'doc',
@@ -280,51 +535,49 @@ def upload_file():
                     'images': doc_content['images']
                 })
             except Exception as e:
-                return jsonify({'error': f'Error reading DOC file: {str(e)}'}), 400
+                return ojson({'error': f'Error reading DOC file: {str(e)}'}), 400
         else:
             # Read CSV to get preview
             try:
-                with open(filepath, 'r', encoding='utf-8') as f:
+                with open(filepath, 'r', encoding='utf-8', newline='') as f:
                     reader = csv.DictReader(f)
-                    contacts = list(reader)
-                    
-                preview = contacts  # Show all contacts
+                    preview = list(islice(reader, PREVIEW_ROWS))
                 
-                return jsonify({
+                return ojson({
                     'success': True,
                     'filename': filename,
                     'file_type': 'csv',
-                    'total_contacts': len(contacts),
+                    'total_contacts': count_csv_rows(filepath),
                     'preview': preview,
-                    'columns': list(contacts[0].keys()) if contacts else []
+                    'columns': list(preview[0].keys()) if preview else []
                 })
             except Exception as e:
-                return jsonify({'error': f'Error reading CSV: {str(e)}'}), 400
+                return ojson({'error': f'Error reading CSV: {str(e)}'}), 400
     
-    return jsonify({'error': 'Invalid file type'}), 400
+    return ojson({'error': 'Invalid file type'}), 400
 
 @app.route('/upload_attachment', methods=['POST'])
 def upload_attachment():
     """Handle attachment file upload"""
     if 'file' not in request.files:
-        return jsonify({'error': 'No file uploaded'}), 400
+        return ojson({'error': 'No file uploaded'}), 400
     
     file = request.files['file']
     if file.filename == '':
-        return jsonify({'error': 'No file selected'}), 400
+        return ojson({'error': 'No file selected'}), 400
     
     if file and allowed_attachment_file(file.filename):
         filename = secure_filename(file.filename)
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         file.save(filepath)
         
-        return jsonify({
+        return ojson({
             'success': True,
             'filename': filename,
             'filepath': filepath
         })
     
-    return jsonify({'error': 'Invalid attachment file type'}), 400
+    return ojson({'error': 'Invalid attachment file type'}), 400
 
 
 
@@ -333,9 +586,6 @@ def start_campaign():
     """Start email campaign"""
     data = request.json
     
-    if campaign_status['running']:
-        return jsonify({'error': 'Campaign already running'}), 400
-    
     csv_file = os.path.join(app.config['UPLOAD_FOLDER'], data['filename'])
     custom_subject = data.get('custom_subject', '')
     custom_body = data.get('custom_body', '')
@@ -343,6 +593,14 @@ def start_campaign():
     embedded_images = data.get('embedded_images', [])
     html_content = data.get('html_content', '')
     
+    # Optional pacing overrides for the SMTP relay
+    try:
+        rate_per_min = float(data.get('message_rate') or CAMPAIGN_SETTINGS['rate_per_min'])
+        burst = int(data.get('burst') or CAMPAIGN_SETTINGS['burst'])
+        concurrency = int(data.get('concurrency') or CAMPAIGN_SETTINGS['concurrency'])
+    except (TypeError, ValueError):
+        return ojson({'error': 'message_rate, burst and concurrency must be numbers'}), 400
+    
     # Debug: Log what we received
     print(f"🔍 Campaign start request:")
     print(f"   CSV file: {data['filename']}")
@@ -353,47 +611,83 @@ def start_campaign():
     print(f"   HTML content length: {len(html_content)}")
     
     if not os.path.exists(csv_file):
-        return jsonify({'error': 'CSV file not found'}), 400
+        return ojson({'error': 'CSV file not found'}), 400
     
-    # Convert attachment filenames to full paths
-    attachment_paths = []
-    for attachment in attachments:
-        attachment_path = os.path.join(app.config['UPLOAD_FOLDER'], attachment)
-        if os.path.exists(attachment_path):
-            attachment_paths.append(attachment_path)
+    # Convert attachment and embedded image filenames to full paths, checking them
+    # against one scan of the upload folder instead of a stat() per file
+    upload_folder = app.config['UPLOAD_FOLDER']
+    with os.scandir(upload_folder) as entries:
+        present = {entry.name for entry in entries}
+    attachment_paths = [os.path.join(upload_folder, name) for name in attachments if name in present]
+    embedded_image_paths = [os.path.join(upload_folder, name) for name in embedded_images if name in present]
     
-    # Convert embedded image filenames to full paths
-    embedded_image_paths = []
-    for image in embedded_images:
-        image_path = os.path.join(app.config['UPLOAD_FOLDER'], image)
-        if os.path.exists(image_path):
-            embedded_image_paths.append(image_path)
+    args = (csv_file, custom_subject, custom_body, attachment_paths, embedded_image_paths, html_content)
+    kwargs = {'rate_per_min': rate_per_min, 'burst': burst, 'concurrency': concurrency}
     
-    # Start campaign in background thread
-    thread = threading.Thread(
-        target=send_campaign_emails,
-        args=(csv_file, custom_subject, custom_body, attachment_paths, embedded_image_paths, html_content)
-    )
-    thread.daemon = True
-    thread.start()
+    # Atomically claim the campaign slot; a check-then-set on the running flag lets two
+    # concurrent requests both start and send the whole list twice
+    lock_token = acquire_campaign()
+    if lock_token is None:
+        return ojson({'error': 'Campaign already running'}), 400
+    kwargs['lock_token'] = lock_token
     
-    return jsonify({'success': True, 'message': 'Campaign started'})
+    # Mark the campaign running before dispatch so status streams don't report it stopped
+    set_running(True)
+    
+    try:
+        if celery is not None:
+            # Hand the campaign to a Celery worker on the "emails" queue
+            send_campaign_emails_task.delay(*args, **kwargs)
+        else:
+            # Start campaign in background thread
+            thread = threading.Thread(
+                target=send_campaign_emails,
+                args=args,
+                kwargs=kwargs
+            )
+            thread.daemon = True
+            thread.start()
+    except Exception as e:
+        set_running(False)
+        release_campaign(lock_token)
+        return ojson({'error': f'Could not start campaign: {str(e)}'}), 500
+    
+    return ojson({'success': True, 'message': 'Campaign started'})
 
 @app.route('/stop_campaign', methods=['POST'])
 def stop_campaign():
     """Stop email campaign"""
-    campaign_status['running'] = False
-    return jsonify({'success': True, 'message': 'Campaign stopped'})
+    set_running(False)
+    return ojson({'success': True, 'message': 'Campaign stopped'})
 
 @app.route('/status')
 def get_status():
     """Get campaign status"""
-    return jsonify(campaign_status)
+    return ojson(read_status())
+
+@app.route('/events')
+def status_events():
+    """Stream campaign status as Server-Sent Events whenever it changes"""
+    # Status written by a Celery worker can't signal this process, so poll Redis briefly instead
+    timeout = 1 if redis_client is not None else EVENTS_TIMEOUT
+    
+    def stream():
+        while True:
+            status = read_status()
+            yield b"data: " + dumps(status) + b"\n\n"
+            # The final snapshot tells the page the campaign ended; it closes the stream on it
+            if not status['running']:
+                return
+            with status_changed:
+                status_changed.wait(timeout=timeout)
+    
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
 
 @app.route('/logs')
 def get_logs():
     """Get campaign logs"""
-    return jsonify({'logs': campaign_status['logs']})
+    return ojson({'logs': read_status()['logs']})
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
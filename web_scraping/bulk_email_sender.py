@@ -4,16 +4,28 @@ Bulk Email Sender for Kirby Service Center Outreach
 Uses Gmail API to send personalized emails to extracted contacts.
 """
 
+import asyncio
 import csv
 import json
+import logging
+import os
+import random
+import re
 import time
 import base64
 import sys
-from typing import List, Dict, Optional
-from datetime import datetime, timedelta
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
 
 # Gmail API imports
 try:
+    import google_auth_httplib2
+    import httplib2
     from google.auth.transport.requests import Request
     from google.oauth2.credentials import Credentials
     from google_auth_oauthlib.flow import InstalledAppFlow
@@ -24,6 +36,17 @@ except ImportError:
     print("Run: pip install google-auth google-auth-oauthlib google-auth-httplib2 google-api-python-client")
     sys.exit(1)
 
+try:
+    import orjson  # Faster parsing/serializing for token.json and the campaign checkpoint
+except ImportError:
+    orjson = None
+
+# Optional: only needed for the async sender (CAMPAIGN_SETTINGS["async_send"])
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
 # Import our configuration
 from email_config import (
     GMAIL_CONFIG, 
@@ -36,12 +59,112 @@ from email_config import (
     validate_email_config
 )
 
+logger = logging.getLogger(__name__)
+
+GMAIL_BATCH_LIMIT = 100  # Maximum requests Gmail accepts in one batch call
+CHECKPOINT_FILE = "state.json"  # Addresses already sent by an unfinished campaign, and which campaign that is
+GMAIL_HTTP_TIMEOUT = 30  # Seconds before a Gmail API request is abandoned
+GMAIL_SEND_URL = "https://gmail.googleapis.com/gmail/v1/users/me/messages/send"
+TOKEN_REFRESH_MARGIN = timedelta(seconds=60)  # Refresh the OAuth token this long before it expires
+RETRYABLE_STATUSES = frozenset((429, 500, 502, 503, 504))
+MAX_SEND_ATTEMPTS = 3
+BACKOFF_BASE = 1  # Seconds before the first retry; doubles on each attempt
+BACKOFF_CAP = 30  # Longest wait between retries, in seconds
+
+def _json_loads(data: bytes):
+    """Parse JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def _json_dumps(obj) -> bytes:
+    """Serialize to JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
+def _normalize_domain(domain: str) -> str:
+    """Lowercase ASCII form of a domain (punycode for unicode names), or '' if it is not valid IDNA"""
+    domain = domain.strip().lower()
+    if domain.isascii():
+        return domain
+    try:
+        return domain.encode('idna').decode('ascii')
+    except UnicodeError:
+        return ''
+
+# Email filters, precompiled once: a set lookup for domains and one regex scan for keywords
+_EXCLUDE_DOMAINS = frozenset(_normalize_domain(domain) for domain in EMAIL_FILTERS["exclude_domains"])
+_EXCLUDE_KEYWORDS_RE = re.compile(
+    '|'.join(map(re.escape, EMAIL_FILTERS["exclude_keywords"])) or r'(?!)',  # (?!) never matches
+    re.IGNORECASE
+)
+
+SENT_FIELDS = ('email', 'name', 'store_name', 'timestamp', 'subject')
+FAILED_FIELDS = ('email', 'name', 'store_name', 'error')
+RESULTS_BUFFER_SIZE = 1 << 20  # Write buffer for the sent/failed result CSVs
+
+CONTACT_FIELDS = ('email', 'name', 'store_name', 'address', 'phone', 'location')
+CONTACT_DEFAULTS = {'name': 'there', 'store_name': 'your service center'}  # Used when the cell is blank
+
+_SENDER_NAME = GMAIL_CONFIG["sender_name"]
+_INCLUDE_LOCATION = PERSONALIZATION_OPTIONS["include_location"]
+
+def _cell(row: List[str], index: Optional[int]) -> str:
+    """Stripped CSV cell at index, or '' if the column or cell is missing"""
+    if index is None or index >= len(row):
+        return ''
+    return row[index].strip()
+
+def _batches(items: Iterable, size: int) -> Iterator[List]:
+    """Consecutive lists of up to size items, read from items only as they are needed"""
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+def _is_retryable(error: Exception) -> bool:
+    """True for transient Gmail errors: 429/5xx or a rate-limit/quota error body"""
+    # googleapiclient HttpError carries resp.status and content; aiohttp errors carry status and message
+    status = getattr(getattr(error, 'resp', None), 'status', None) or getattr(error, 'status', None)
+    try:
+        if int(status) in RETRYABLE_STATUSES:
+            return True
+    except (TypeError, ValueError):
+        pass
+    content = getattr(error, 'content', None) or getattr(error, 'message', None) or ''
+    if isinstance(content, bytes):
+        content = content.decode('utf-8', 'replace')
+    return 'rateLimit' in content or 'quota' in content
+
+def _backoff_delay(attempt: int, error: Exception) -> float:
+    """Seconds to wait before retry number attempt + 1, honoring any Retry-After header"""
+    delay = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.8, 1.2)
+    headers = getattr(error, 'resp', None) or getattr(error, 'headers', None) or {}
+    try:
+        delay = max(delay, float(headers.get('retry-after') or headers.get('Retry-After') or 0))
+    except (TypeError, ValueError):
+        pass
+    return delay
+
 class BulkEmailSender:
     def __init__(self):
         self.service = None
+        self.creds = None
         self.sent_emails = []
         self.failed_emails = []
+        self.duplicates_skipped = 0
+        self.read_error = None  # Set by iter_contacts when the CSV could not be read to the end
+        # Headers shared by every message, encoded once
+        self._header_prefix = (
+            f"From: {GMAIL_CONFIG['sender_email']}\r\n"
+            f"Content-Type: text/plain; charset=utf-8\r\n"
+        ).encode('utf-8')
         self.campaign_settings = get_campaign_settings()
+        self._local = threading.local()  # Per-thread Gmail service for batch workers
+        self.sent_addresses = set()  # Lowercased addresses sent so far, mirrored to CHECKPOINT_FILE
+        self.campaign_id = None  # CSV path and template of the running campaign; None disables the checkpoint
+        self._checkpoint_lock = threading.Lock()
+        self._next_send_ts = 0.0  # time.monotonic() at which send capacity is next free
         
     def authenticate_gmail(self):
         """Authenticate with Gmail API"""
@@ -49,10 +172,11 @@ class BulkEmailSender:
         
         # Load existing token
         if os.path.exists(GMAIL_CONFIG["token_file"]):
-            creds = Credentials.from_authorized_user_file(
-                GMAIL_CONFIG["token_file"], 
-                GMAIL_CONFIG["scopes"]
-            )
+            with open(GMAIL_CONFIG["token_file"], 'rb') as token:
+                creds = Credentials.from_authorized_user_info(
+                    _json_loads(token.read()),
+                    GMAIL_CONFIG["scopes"]
+                )
         
         # If no valid credentials, get new ones
         if not creds or not creds.valid:
@@ -69,8 +193,11 @@ class BulkEmailSender:
             with open(GMAIL_CONFIG["token_file"], 'w') as token:
                 token.write(creds.to_json())
         
+        self.creds = creds
         try:
-            self.service = build('gmail', 'v1', credentials=creds)
+            # One authorized keep-alive transport shared by every send in the campaign
+            authed_http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http(timeout=GMAIL_HTTP_TIMEOUT))
+            self.service = build('gmail', 'v1', http=authed_http, cache_discovery=False)
             print("✅ Gmail API authenticated successfully")
             return True
         except Exception as e:
@@ -82,102 +209,89 @@ class BulkEmailSender:
         if not email or '@' not in email:
             return False
         
-        domain = email.split('@')[1].lower()
-        
-        # Check excluded domains
-        if domain in EMAIL_FILTERS["exclude_domains"]:
+        _, _, domain = email.rpartition('@')
+        domain = _normalize_domain(domain)
+        if not domain:
             return False
-        
-        # Check excluded keywords
-        for keyword in EMAIL_FILTERS["exclude_keywords"]:
-            if keyword.lower() in email.lower():
-                return False
-        
-        return True
+        return domain not in _EXCLUDE_DOMAINS and not _EXCLUDE_KEYWORDS_RE.search(email)
     
-    def load_contacts(self, csv_file: str) -> List[Dict]:
-        """Load contacts from CSV file"""
-        contacts = []
-        
+    def iter_contacts(self, csv_file: str) -> Iterator[Dict]:
+        """Yield valid contacts from CSV file one row at a time, skipping repeated addresses; read errors end the stream and set read_error"""
+        self.duplicates_skipped = 0
+        self.read_error = None
         try:
-            with open(csv_file, 'r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
+            with open(csv_file, 'r', encoding='utf-8', newline='') as file:
+                reader = csv.reader(file)
+                header = next(reader, [])
+                
+                # Resolve column positions and fallbacks once instead of per row
+                columns = [
+                    (field, header.index(field) if field in header else None, CONTACT_DEFAULTS.get(field, ''))
+                    for field in CONTACT_FIELDS
+                ]
+                email_idx = header.index('email') if 'email' in header else None
+                seen = set()  # Lowercased addresses already yielded; first occurrence wins
                 
                 for row in reader:
-                    email = row.get('email', '').strip()
+                    email = _cell(row, email_idx)
                     
                     if self.validate_email(email):
-                        contact = {
-                            'email': email,
-                            'name': row.get('name', '').strip(),
-                            'store_name': row.get('store_name', '').strip(),
-                            'address': row.get('address', '').strip(),
-                            'phone': row.get('phone', '').strip(),
-                            'location': row.get('location', '').strip()
-                        }
-                        contacts.append(contact)
-        
-        except FileNotFoundError:
-            print(f"❌ Error: CSV file '{csv_file}' not found.")
-            return []
-        except Exception as e:
-            print(f"❌ Error reading CSV file: {e}")
-            return []
-        
-        print(f"✅ Loaded {len(contacts)} valid contacts from '{csv_file}'")
-        return contacts
+                        key = email.lower()
+                        if key in seen:
+                            self.duplicates_skipped += 1
+                            continue
+                        seen.add(key)
+                        yield {field: _cell(row, i) or default for field, i, default in columns}
+        except (OSError, csv.Error, UnicodeDecodeError) as e:
+            # Only reading the file is covered here; errors while sending are raised in the caller
+            print(f"❌ Error reading CSV file '{csv_file}': {e}")
+            self.read_error = e
     
-    def personalize_email(self, template: str, contact: Dict) -> str:
-        """Personalize email template with contact data"""
-        # Basic personalization
-        personalized = template.format(
-            name=contact.get('name', 'there'),
-            store_name=contact.get('store_name', 'your service center'),
-            sender_name=GMAIL_CONFIG["sender_name"]
-        )
+    def personalize_email(self, template: Dict, contact: Dict) -> Tuple[str, str]:
+        """Render a compiled template's subject and body with contact data"""
+        # Contacts come from iter_contacts with fallbacks already filled in
+        context = {
+            'name': contact['name'],
+            'store_name': contact['store_name'],
+            'sender_name': _SENDER_NAME,
+            'location': contact['location']
+        }
+        subject = template["_compiled_subject"](context)
+        personalized = template["_compiled_template"](context)
         
         # Add location if enabled
-        if PERSONALIZATION_OPTIONS["include_location"] and contact.get('location'):
-            personalized = personalized.replace(
-                "[LOCATION]", 
-                contact.get('location', '')
-            )
+        if _INCLUDE_LOCATION and contact['location']:
+            personalized = personalized.replace("[LOCATION]", contact['location'])
         
-        return personalized
+        return subject, personalized
     
     def create_email_message(self, to_email: str, subject: str, body: str) -> Dict:
         """Create Gmail API message format"""
-        message = {
-            'raw': base64.urlsafe_b64encode(
-                f"To: {to_email}\r\n"
-                f"From: {GMAIL_CONFIG['sender_email']}\r\n"
-                f"Subject: {subject}\r\n"
-                f"Content-Type: text/plain; charset=utf-8\r\n"
-                f"\r\n"
-                f"{body}".encode('utf-8')
-            ).decode('utf-8')
-        }
-        return message
+        raw = b"".join([
+            b"To: ", to_email.encode('utf-8'), b"\r\n",
+            self._header_prefix,
+            b"Subject: ", subject.encode('utf-8'), b"\r\n\r\n",
+            body.encode('utf-8')
+        ])
+        # The base64 alphabet is pure ASCII, so the cheaper ascii codec is enough
+        return {'raw': base64.urlsafe_b64encode(raw).decode('ascii')}
     
     def send_email(self, to_email: str, subject: str, body: str) -> bool:
         """Send single email via Gmail API"""
+        if self.campaign_settings["test_mode"]:
+            # In test mode, just log the email; lazy %-args cost nothing unless DEBUG is enabled
+            logger.debug("TEST MODE - would send to=%s subject=%s body=%.100s", to_email, subject, body)
+            return True
+        
         try:
             message = self.create_email_message(to_email, subject, body)
             
-            if self.campaign_settings["test_mode"]:
-                # In test mode, just log the email
-                print(f"📧 TEST MODE - Would send to: {to_email}")
-                print(f"   Subject: {subject}")
-                print(f"   Body: {body[:100]}...")
-                return True
-            
             # Send actual email
-            sent_message = self.service.users().messages().send(
-                userId='me', 
-                body=message
-            ).execute()
+            sent_message = self._execute_with_retry(
+                self.service.users().messages().send(userId='me', body=message)
+            )
             
-            print(f"✅ Email sent to {to_email} (Message ID: {sent_message['id']})")
+            logger.debug("Email sent to %s (Message ID: %s)", to_email, sent_message['id'])
             return True
             
         except HttpError as error:
@@ -187,73 +301,327 @@ class BulkEmailSender:
             print(f"❌ Error sending email to {to_email}: {e}")
             return False
     
-    def send_bulk_emails(self, contacts: List[Dict], template_name: str = None):
-        """Send bulk emails to contacts"""
-        if not contacts:
-            print("❌ No contacts to send emails to.")
+    def _execute_with_retry(self, request):
+        """Execute a Gmail API request, backing off and retrying transient errors"""
+        for attempt in range(MAX_SEND_ATTEMPTS):
+            try:
+                return request.execute()
+            except HttpError as error:
+                if attempt + 1 >= MAX_SEND_ATTEMPTS or not _is_retryable(error):
+                    raise
+                time.sleep(_backoff_delay(attempt, error))
+    
+    def send_batch(self, batch: List[Dict], template: Dict):
+        """Personalize and send a batch of emails in a single Gmail API batch request"""
+        emails = []
+        for contact in batch:
+            # Personalize email
+            subject, body = self.personalize_email(template, contact)
+            emails.append((contact, subject, body))
+        
+        if self.campaign_settings["test_mode"]:
+            for contact, subject, body in emails:
+                self.send_email(contact['email'], subject, body)
+                self._record_sent(contact, subject)
+            print(f"📧 TEST MODE - {len(emails)} emails rendered, none sent")
             return
         
+        # Messages that hit transient errors go out again in a smaller batch
+        for attempt in range(MAX_SEND_ATTEMPTS):
+            final = attempt + 1 >= MAX_SEND_ATTEMPTS
+            emails, error = self._execute_batch(emails, final)
+            if not emails:
+                break
+            delay = _backoff_delay(attempt, error)
+            print(f"🔁 Retrying {len(emails)} emails in {delay:.1f} seconds...")
+            time.sleep(delay)
+        
+        self._save_checkpoint()
+    
+    def _thread_service(self):
+        """Gmail service for the calling thread; httplib2 connections must not be shared across threads"""
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            authed_http = google_auth_httplib2.AuthorizedHttp(self.creds, http=httplib2.Http(timeout=GMAIL_HTTP_TIMEOUT))
+            service = self._local.service = build('gmail', 'v1', http=authed_http, cache_discovery=False)
+        return service
+    
+    def _execute_batch(self, emails: List[tuple], final: bool):
+        """Send emails in one Gmail API batch request; returns (emails to retry, last retryable error)"""
+        service = self._thread_service()
+        pending = {}  # Batch request id -> (contact, subject, body) awaiting a response
+        retry = []
+        retry_error = None
+        
+        def on_response(request_id: str, response: Optional[Dict], exception: Optional[Exception]):
+            """Batch callback: record the outcome of one message"""
+            nonlocal retry_error
+            contact, subject, body = pending.pop(request_id)
+            if exception is not None:
+                if not final and _is_retryable(exception):
+                    retry.append((contact, subject, body))
+                    retry_error = exception
+                    return
+                print(f"❌ Failed to send email to {contact['email']}: {exception}")
+                self._record_failed(contact, str(exception))
+            else:
+                logger.debug("Email sent to %s (Message ID: %s)", contact['email'], response['id'])
+                self._record_sent(contact, subject)
+        
+        # One HTTP round trip for the whole batch; results arrive via on_response
+        batch_request = service.new_batch_http_request(callback=on_response)
+        for n, (contact, subject, body) in enumerate(emails):
+            request_id = str(n)
+            pending[request_id] = (contact, subject, body)
+            message = self.create_email_message(contact['email'], subject, body)
+            batch_request.add(
+                service.users().messages().send(userId='me', body=message),
+                request_id=request_id
+            )
+        
+        try:
+            batch_request.execute()
+        except Exception as e:
+            # The whole batch failed before any per-message responses came back
+            if not final and _is_retryable(e):
+                return retry + list(pending.values()), e
+            print(f"❌ Batch request failed: {e}")
+            for contact, subject, body in pending.values():
+                self._record_failed(contact, str(e))
+        return retry, retry_error
+    
+    def _record_sent(self, contact: Dict, subject: str):
+        """Add a contact to the sent log as a SENT_FIELDS row"""
+        with self._checkpoint_lock:
+            self.sent_addresses.add(contact['email'].lower())
+        self.sent_emails.append((
+            contact['email'],
+            contact['name'],
+            contact['store_name'],
+            time.strftime('%Y-%m-%dT%H:%M:%S'),
+            subject
+        ))
+    
+    def _record_failed(self, contact: Dict, error: str = 'Failed to send'):
+        """Add a contact to the failed log as a FAILED_FIELDS row"""
+        self.failed_emails.append((
+            contact['email'],
+            contact['name'],
+            contact['store_name'],
+            error
+        ))
+    
+    def _reserve_send_slots(self, count: int) -> float:
+        """Reserve rate-limit capacity for count sends; returns seconds to wait before sending"""
+        rps = self.campaign_settings["rate_limit_rps"]
+        if rps <= 0:
+            return 0.0
+        now = time.monotonic()
+        start = max(now, self._next_send_ts)
+        self._next_send_ts = start + count / rps
+        return start - now
+    
+    def _begin_campaign(self, csv_file: Optional[str], template_name: str):
+        """Key the checkpoint to this CSV file and template, as SentLog does for the SMTP senders"""
+        self.campaign_id = f"{os.path.abspath(csv_file)}:{template_name}" if csv_file else None
+    
+    def _load_checkpoint(self) -> Optional[Tuple[str, set]]:
+        """(campaign id, sent addresses) from CHECKPOINT_FILE, or None if there is no usable checkpoint"""
+        if self.campaign_settings["test_mode"] or self.campaign_id is None:
+            return None
+        try:
+            with open(CHECKPOINT_FILE, 'rb') as file:
+                checkpoint = _json_loads(file.read())
+            return checkpoint['campaign'], set(checkpoint['sent'])
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"⚠️  Ignoring unreadable checkpoint '{CHECKPOINT_FILE}': {e}")
+            return None
+    
+    def _skip_already_sent(self, contacts: Iterable[Dict]) -> Iterable[Dict]:
+        """Drop contacts an interrupted run of this campaign already emailed, per CHECKPOINT_FILE"""
+        checkpoint = self._load_checkpoint()
+        if checkpoint is None:
+            return contacts
+        campaign_id, sent_addresses = checkpoint
+        if campaign_id != self.campaign_id:
+            print(f"⚠️  Ignoring checkpoint '{CHECKPOINT_FILE}' from another campaign ({campaign_id})")
+            return contacts
+        self.sent_addresses = sent_addresses
+        
+        print(f"↩️  Resuming from {CHECKPOINT_FILE}: skipping {len(sent_addresses)} addresses already sent")
+        return (contact for contact in contacts if contact['email'].lower() not in sent_addresses)
+    
+    def _save_checkpoint(self):
+        """Atomically record the addresses sent so far so a restart won't re-send them"""
+        if self.campaign_id is None:
+            return
+        with self._checkpoint_lock:
+            with tempfile.NamedTemporaryFile('wb', suffix='.tmp', delete=False,
+                                             dir=os.path.dirname(os.path.abspath(CHECKPOINT_FILE))) as tmp:
+                tmp.write(_json_dumps({'campaign': self.campaign_id, 'sent': sorted(self.sent_addresses)}))
+            os.replace(tmp.name, CHECKPOINT_FILE)
+    
+    def _clear_checkpoint(self):
+        """Remove the checkpoint once its campaign has run to completion"""
+        checkpoint = self._load_checkpoint()
+        if checkpoint is not None and checkpoint[0] == self.campaign_id:
+            os.remove(CHECKPOINT_FILE)
+    
+    def send_bulk_emails(self, contacts: Iterable[Dict], template_name: str = None, csv_file: str = None):
+        """Send bulk emails to contacts, read one batch at a time; ``csv_file`` names their source so an interrupted run can resume"""
         # Get template
         template_name = template_name or self.campaign_settings["default_template"]
         template = get_template(template_name)
         
+        self._begin_campaign(csv_file, template_name)
+        contacts = self._skip_already_sent(contacts)
+        
         print(f"📧 Starting bulk email campaign...")
         print(f"   Template: {template_name}")
-        print(f"   Contacts: {len(contacts)}")
         print(f"   Test Mode: {self.campaign_settings['test_mode']}")
         
-        # Process contacts in batches
-        batch_size = self.campaign_settings["batch_size"]
-        total_sent = 0
+        # Process contacts in batches, each sent as one Gmail API batch request
+        batch_size = min(self.campaign_settings["batch_size"], GMAIL_BATCH_LIMIT)
+        max_workers = self.campaign_settings["max_concurrency"]
         
-        for i in range(0, len(contacts), batch_size):
-            batch = contacts[i:i + batch_size]
-            batch_num = (i // batch_size) + 1
-            total_batches = (len(contacts) + batch_size - 1) // batch_size
-            
-            print(f"\n📦 Processing batch {batch_num}/{total_batches} ({len(batch)} contacts)")
-            
-            for j, contact in enumerate(batch, 1):
-                # Personalize email
-                subject = template["subject"].format(
-                    store_name=contact.get('store_name', 'your service center')
-                )
-                body = self.personalize_email(template["template"], contact)
-                
-                # Send email
-                success = self.send_email(contact['email'], subject, body)
-                
-                if success:
-                    self.sent_emails.append({
-                        'email': contact['email'],
-                        'name': contact['name'],
-                        'store_name': contact['store_name'],
-                        'timestamp': datetime.now().isoformat(),
-                        'subject': subject
-                    })
-                    total_sent += 1
-                else:
-                    self.failed_emails.append({
-                        'email': contact['email'],
-                        'name': contact['name'],
-                        'store_name': contact['store_name'],
-                        'error': 'Failed to send'
-                    })
+        # Batches run on worker threads so one slow round trip doesn't hold up the next
+        total = 0
+        completed = False
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = deque()
+                for batch_num, batch in enumerate(_batches(contacts, batch_size), 1):
+                    total += len(batch)
+                    
+                    # Wait only as long as the rate limit requires for this many sends
+                    wait = self._reserve_send_slots(len(batch))
+                    if wait > 0:
+                        print(f"⏳ Waiting {wait:.1f} seconds before next batch...")
+                        time.sleep(wait)
+                    
+                    print(f"\n📦 Processing batch {batch_num} ({len(batch)} contacts)")
+                    futures.append(executor.submit(self.send_batch, batch, template))
+                    # Read no further ahead of the workers than they can keep busy
+                    while len(futures) > max_workers:
+                        futures.popleft().result()
                 
-                # Delay between emails
-                if j < len(batch):
-                    time.sleep(self.campaign_settings["delay_between_emails"])
+                for future in futures:
+                    future.result()
+            completed = self.read_error is None
+        finally:
+            # Results of the batches already sent are saved even if the run fails partway
+            if total:
+                self.finish_campaign(completed)
+        if not total:
+            self._report_nothing_to_send()
+    
+    def _report_nothing_to_send(self):
+        """Report a campaign whose CSV had nothing left to send"""
+        if self.read_error is not None:
+            return
+        if self.sent_addresses:
+            print("✅ Every contact was already sent in an earlier run.")
+            self._clear_checkpoint()
+        else:
+            print("❌ No contacts to send emails to.")
+    
+    async def _ensure_fresh_token(self, lock: asyncio.Lock):
+        """Refresh the OAuth token before it expires so in-flight sends don't hit 401s"""
+        async with lock:
+            expiry = self.creds.expiry
+            # google-auth keeps expiry as a naive UTC datetime; make it aware to compare with now
+            if expiry is None or expiry.replace(tzinfo=timezone.utc) - datetime.now(timezone.utc) > TOKEN_REFRESH_MARGIN:
+                return
+            # google-auth refreshes synchronously; keep it off the event loop
+            await asyncio.to_thread(self.creds.refresh, Request())
+    
+    async def send_email_async(self, session, to_email: str, subject: str, body: str) -> Optional[str]:
+        """Send single email by posting to the Gmail API directly; returns the message id"""
+        message = self.create_email_message(to_email, subject, body)
+        headers = {'Authorization': f'Bearer {self.creds.token}'}
+        async with session.post(GMAIL_SEND_URL, json=message, headers=headers) as response:
+            if response.status != 200:
+                raise aiohttp.ClientResponseError(
+                    response.request_info,
+                    response.history,
+                    status=response.status,
+                    message=await response.text(),
+                    headers=response.headers
+                )
+            return (await response.json())['id']
+    
+    async def send_bulk_emails_async(self, contacts: Iterable[Dict], template_name: str = None, csv_file: str = None):
+        """Send bulk emails concurrently, at most max_concurrency requests in flight"""
+        template_name = template_name or self.campaign_settings["default_template"]
+        template = get_template(template_name)
+        
+        self._begin_campaign(csv_file, template_name)
+        contacts = self._skip_already_sent(contacts)
+        max_concurrency = self.campaign_settings["max_concurrency"]
+        
+        print(f"📧 Starting async bulk email campaign...")
+        print(f"   Template: {template_name}")
+        print(f"   Concurrency: {max_concurrency}")
+        print(f"   Test Mode: {self.campaign_settings['test_mode']}")
+        
+        semaphore = asyncio.Semaphore(max_concurrency)
+        refresh_lock = asyncio.Lock()
+        
+        async def send_one(session, contact: Dict):
+            subject, body = self.personalize_email(template, contact)
+            
+            if self.campaign_settings["test_mode"]:
+                self.send_email(contact['email'], subject, body)
+                self._record_sent(contact, subject)
+                return
             
-            # Delay between batches
-            if i + batch_size < len(contacts):
-                print(f"⏳ Waiting {self.campaign_settings['delay_between_batches']} seconds before next batch...")
-                time.sleep(self.campaign_settings["delay_between_batches"])
+            for attempt in range(MAX_SEND_ATTEMPTS):
+                await asyncio.sleep(self._reserve_send_slots(1))
+                async with semaphore:
+                    try:
+                        await self._ensure_fresh_token(refresh_lock)
+                        message_id = await self.send_email_async(session, contact['email'], subject, body)
+                        break
+                    except Exception as e:
+                        error = e
+                # Back off outside the semaphore so other sends keep the slot busy
+                if attempt + 1 >= MAX_SEND_ATTEMPTS or not _is_retryable(error):
+                    print(f"❌ Failed to send email to {contact['email']}: {error}")
+                    self._record_failed(contact, str(error))
+                    return
+                await asyncio.sleep(_backoff_delay(attempt, error))
+            logger.debug("Email sent to %s (Message ID: %s)", contact['email'], message_id)
+            self._record_sent(contact, subject)
         
-        # Save results
+        batch_size = self.campaign_settings["batch_size"]
+        total = 0
+        completed = False
+        try:
+            async with aiohttp.ClientSession() as session:
+                for batch_num, batch in enumerate(_batches(contacts, batch_size), 1):
+                    total += len(batch)
+                    print(f"\n📦 Processing batch {batch_num} ({len(batch)} contacts)")
+                    await asyncio.gather(*[send_one(session, contact) for contact in batch])
+                    if not self.campaign_settings["test_mode"]:
+                        self._save_checkpoint()
+            completed = self.read_error is None
+        finally:
+            if total:
+                self.finish_campaign(completed)
+        if not total:
+            self._report_nothing_to_send()
+    
+    def finish_campaign(self, completed: bool = True):
+        """Save results and print the campaign summary; an incomplete run keeps its checkpoint to resume from"""
         self.save_campaign_results()
-        
-        print(f"\n🎉 Campaign completed!")
-        print(f"   ✅ Sent: {total_sent}")
+        if completed:
+            self._clear_checkpoint()
+            print(f"\n🎉 Campaign completed!")
+        else:
+            print(f"\n🛑 Campaign stopped early; run it again to resume")
+        print(f"   ✅ Sent: {len(self.sent_emails)}")
         print(f"   ❌ Failed: {len(self.failed_emails)}")
     
     def save_campaign_results(self):
@@ -263,18 +631,18 @@ class BulkEmailSender:
         # Save sent emails
         if self.sent_emails:
             sent_file = f"sent_emails_{timestamp}.csv"
-            with open(sent_file, 'w', newline='', encoding='utf-8') as file:
-                writer = csv.DictWriter(file, fieldnames=['email', 'name', 'store_name', 'timestamp', 'subject'])
-                writer.writeheader()
+            with open(sent_file, 'w', newline='', encoding='utf-8', buffering=RESULTS_BUFFER_SIZE) as file:
+                writer = csv.writer(file)
+                writer.writerow(SENT_FIELDS)
                 writer.writerows(self.sent_emails)
             print(f"📁 Sent emails saved to: {sent_file}")
         
         # Save failed emails
         if self.failed_emails:
             failed_file = f"failed_emails_{timestamp}.csv"
-            with open(failed_file, 'w', newline='', encoding='utf-8') as file:
-                writer = csv.DictWriter(file, fieldnames=['email', 'name', 'store_name', 'error'])
-                writer.writeheader()
+            with open(failed_file, 'w', newline='', encoding='utf-8', buffering=RESULTS_BUFFER_SIZE) as file:
+                writer = csv.writer(file)
+                writer.writerow(FAILED_FIELDS)
                 writer.writerows(self.failed_emails)
             print(f"📁 Failed emails saved to: {failed_file}")
 
@@ -285,6 +653,9 @@ def main():
         print("Example: python3 bulk_email_sender.py kirby_contacts.csv kirby_partnership")
         sys.exit(1)
     
+    # Per-email test-mode output is DEBUG; raise the level to see it
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
     contacts_file = sys.argv[1]
     template_name = sys.argv[2] if len(sys.argv) > 2 else None
     
@@ -299,14 +670,23 @@ def main():
     if not sender.authenticate_gmail():
         sys.exit(1)
     
-    # Load contacts
-    contacts = sender.load_contacts(contacts_file)
-    if not contacts:
+    if not os.path.isfile(contacts_file):
+        print(f"❌ Error: CSV file '{contacts_file}' not found.")
         sys.exit(1)
     
-    # Send bulk emails
-    sender.send_bulk_emails(contacts, template_name)
+    # Send bulk emails, streaming contacts from the CSV one batch at a time
+    contacts = sender.iter_contacts(contacts_file)
+    if sender.campaign_settings["async_send"]:
+        if aiohttp is None:
+            print("❌ Error: async_send needs aiohttp. Run: pip install aiohttp")
+            sys.exit(1)
+        asyncio.run(sender.send_bulk_emails_async(contacts, template_name, contacts_file))
+    else:
+        sender.send_bulk_emails(contacts, template_name, contacts_file)
+    if sender.duplicates_skipped:
+        print(f"   Skipped {sender.duplicates_skipped} duplicate email addresses")
+    if sender.read_error is not None:
+        sys.exit(1)
 
 if __name__ == "__main__":
-    import os
     main() 
\ No newline at end of file
@@ -2,9 +2,16 @@
 
 # Different parameter sets for different use cases
 
+import sys
+from types import MappingProxyType
+
+def _locations(names):
+    """Freeze a location list as a tuple of interned strings"""
+    return tuple(sys.intern(name) for name in names)
+
 # Parameter Set 1: Major US Cities (Quick Test)
 MAJOR_CITIES_CONFIG = {
-    "locations": [
+    "locations": _locations([
         "New York, NY",
         "Los Angeles, CA", 
         "Chicago, IL",
@@ -15,7 +22,7 @@ MAJOR_CITIES_CONFIG = {
         "San Diego, CA",
         "Dallas, TX",
         "San Jose, CA"
-    ],
+    ]),
     "search_radius": "50",  # 50 miles
     "max_results": "25",
     "description": "Major US Cities - Quick Test"
@@ -23,7 +30,7 @@ MAJOR_CITIES_CONFIG = {
 
 # Parameter Set 2: Top 50 Major US Cities (Population Based)
 TOP_50_CITIES_CONFIG = {
-    "locations": [
+    "locations": _locations([
         "New York City, NY",
         "Los Angeles, CA",
         "Chicago, IL",
@@ -74,7 +81,7 @@ TOP_50_CITIES_CONFIG = {
         "Tulsa, OK",
         "Tampa, FL",
         "Arlington, TX"
-    ],
+    ]),
     "search_radius": "75",  # 75 miles
     "max_results": "50",
     "description": "Top 50 Major US Cities - Population Based"
@@ -82,7 +89,7 @@ TOP_50_CITIES_CONFIG = {
 
 # Parameter Set 3: All 50 US States (Complete Coverage)
 ALL_50_STATES_CONFIG = {
-    "locations": [
+    "locations": _locations([
         "Alabama",
         "Alaska",
         "Arizona",
@@ -133,7 +140,7 @@ ALL_50_STATES_CONFIG = {
         "West Virginia",
         "Wisconsin",
         "Wyoming"
-    ],
+    ]),
     "search_radius": "100",  # 100 miles
     "max_results": "50",
     "description": "All 50 US States - Complete Coverage"
@@ -141,7 +148,7 @@ ALL_50_STATES_CONFIG = {
 
 # Parameter Set 4: All US States (Comprehensive) - Legacy version
 ALL_STATES_CONFIG = {
-    "locations": [
+    "locations": _locations([
         "Alaska", "Texas", "California", "Montana", "New Mexico",
         "Arizona", "Nevada", "Colorado", "Oregon", "Wyoming",
         "Michigan", "Minnesota", "Utah", "Idaho", "Kansas",
@@ -152,7 +159,7 @@ ALL_STATES_CONFIG = {
         "Tennessee", "Kentucky", "Indiana", "Maine", "South Carolina",
         "West Virginia", "Maryland", "Hawaii", "Massachusetts", "Vermont",
         "New Hampshire", "New Jersey", "Connecticut"
-    ],
+    ]),
     "search_radius": "100",  # 100 miles
     "max_results": "50",
     "description": "All US States - Comprehensive Search (Legacy)"
@@ -160,7 +167,7 @@ ALL_STATES_CONFIG = {
 
 # Parameter Set 5: Robotics Hub Cities (Focused)
 ROBOTICS_HUBS_CONFIG = {
-    "locations": [
+    "locations": _locations([
         "San Francisco, CA",
         "Seattle, WA", 
         "Boston, MA",
@@ -171,7 +178,7 @@ ROBOTICS_HUBS_CONFIG = {
         "Portland, OR",
         "San Diego, CA",
         "Cambridge, MA"
-    ],
+    ]),
     "search_radius": "75",  # 75 miles
     "max_results": "75",
     "description": "Robotics Hub Cities - Focused Search"
@@ -179,12 +186,12 @@ ROBOTICS_HUBS_CONFIG = {
 
 # Parameter Set 6: High Population States (Dense Coverage)
 HIGH_POPULATION_CONFIG = {
-    "locations": [
+    "locations": _locations([
         "California", "Texas", "Florida", "New York", "Pennsylvania",
         "Illinois", "Ohio", "Georgia", "North Carolina", "Michigan",
         "New Jersey", "Virginia", "Washington", "Arizona", "Massachusetts",
         "Tennessee", "Indiana", "Missouri", "Maryland", "Colorado"
-    ],
+    ]),
     "search_radius": "200",  # 200 miles
     "max_results": "100",
     "description": "High Population States - Dense Coverage"
@@ -192,13 +199,13 @@ HIGH_POPULATION_CONFIG = {
 
 # Parameter Set 7: Custom Locations (User Defined)
 CUSTOM_CONFIG = {
-    "locations": [
+    "locations": _locations([
         # Add your custom locations here
         "Houston, TX",
         "Dallas, TX", 
         "Austin, TX",
         "San Antonio, TX"
-    ],
+    ]),
     "search_radius": "50",  # 50 miles
     "max_results": "25",
     "description": "Custom Locations - User Defined"
@@ -226,35 +233,27 @@ MAX_RESULTS_OPTIONS = {
 # Default configuration
 DEFAULT_CONFIG = MAJOR_CITIES_CONFIG
 
+# All named configurations, built once and read-only
+CONFIGS = MappingProxyType({
+    "major_cities": MAJOR_CITIES_CONFIG,
+    "top_50_cities": TOP_50_CITIES_CONFIG,
+    "all_50_states": ALL_50_STATES_CONFIG,
+    "all_states": ALL_STATES_CONFIG,
+    "robotics_hubs": ROBOTICS_HUBS_CONFIG,
+    "high_population": HIGH_POPULATION_CONFIG,
+    "custom": CUSTOM_CONFIG
+})
+
 # Function to get configuration by name
 def get_config(config_name):
     """Get configuration by name"""
-    configs = {
-        "major_cities": MAJOR_CITIES_CONFIG,
-        "top_50_cities": TOP_50_CITIES_CONFIG,
-        "all_50_states": ALL_50_STATES_CONFIG,
-        "all_states": ALL_STATES_CONFIG,
-        "robotics_hubs": ROBOTICS_HUBS_CONFIG,
-        "high_population": HIGH_POPULATION_CONFIG,
-        "custom": CUSTOM_CONFIG
-    }
-    return configs.get(config_name, DEFAULT_CONFIG)
+    return CONFIGS.get(config_name, DEFAULT_CONFIG)
 
 # Function to list available configurations
 def list_configs():
     """List all available configurations"""
-    configs = {
-        "major_cities": MAJOR_CITIES_CONFIG,
-        "top_50_cities": TOP_50_CITIES_CONFIG,
-        "all_50_states": ALL_50_STATES_CONFIG,
-        "all_states": ALL_STATES_CONFIG,
-        "robotics_hubs": ROBOTICS_HUBS_CONFIG,
-        "high_population": HIGH_POPULATION_CONFIG,
-        "custom": CUSTOM_CONFIG
-    }
-    
     print("Available configurations:")
-    for name, config in configs.items():
+    for name, config in CONFIGS.items():
         print(f"  {name}: {config['description']}")
         print(f"    Locations: {len(config['locations'])}")
         print(f"    Radius: {config['search_radius']} miles")
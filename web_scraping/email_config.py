@@ -2,7 +2,9 @@
 # Gmail API and Email Template Settings
 
 import os
-from typing import Dict, List
+import string
+from functools import lru_cache
+from typing import Callable, Dict, List
 
 # Gmail API Configuration
 GMAIL_CONFIG = {
@@ -14,126 +16,31 @@ GMAIL_CONFIG = {
 }
 
 # Email Templates
+# Bodies live in email_templates/<name>.txt and are read on first use by get_template
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "email_templates")
+
 EMAIL_TEMPLATES = {
     "kirby_partnership": {
         "subject": "Partnership Opportunity - {company_name}",
-        "template": """
-Dear {name},
-
-I hope this email finds you well. My name is {sender_name} from {company_name}, and I'm reaching out regarding a potential partnership opportunity with your Kirby service center.
-
-{business_description}
-
-I noticed that {store_name} is an authorized Kirby service center, and I believe there could be mutual benefits in exploring a partnership. We specialize in innovative solutions and are looking to expand our network of trusted service providers.
-
-**Why Partner with Us:**
-• Access to cutting-edge technology solutions
-• Increased revenue opportunities
-• Enhanced service offerings for your customers
-
-**What We Offer:**
-• Custom automation solutions
-• Technical support and training
-• Marketing and business development support
-
-Would you be interested in a brief 15-minute call to discuss how we might work together? I'm available at your convenience and would be happy to share more details about our partnership program.
-
-Best regards,
-{sender_name}
-{company_name}
-Phone: {phone_number}
-Website: {website}
-        """,
+        "path": os.path.join(TEMPLATES_DIR, "kirby_partnership.txt"),
         "variables": ["name", "store_name", "sender_name", "business_description", "company_name", "phone_number", "website"]
     },
     
     "kirby_networking": {
         "subject": "Networking Opportunity - {company_name}",
-        "template": """
-Hello {name},
-
-I hope you're having a great day! I'm {sender_name} from {company_name}, and I'm reaching out to connect with fellow Kirby service center professionals.
-
-{business_description}
-
-I came across {store_name} and was impressed by your service center's presence in the community. As someone who also works in the technology space, I believe there's value in building connections within our network.
-
-**I'd love to:**
-• Learn about your experience as a Kirby service center
-• Share insights about automation and technology solutions
-• Explore potential collaboration opportunities
-
-Would you be open to a brief conversation? I'm flexible with timing and would be happy to accommodate your schedule.
-
-Looking forward to connecting!
-
-Best regards,
-{sender_name}
-{company_name}
-Phone: {phone_number}
-Website: {website}
-        """,
+        "path": os.path.join(TEMPLATES_DIR, "kirby_networking.txt"),
         "variables": ["name", "store_name", "sender_name", "business_description", "company_name", "phone_number", "website"]
     },
     
     "kirby_business_development": {
         "subject": "Business Development Opportunity - {company_name}",
-        "template": """
-Dear {name},
-
-I hope this message reaches you well. I'm {sender_name} from {company_name}, and I'm reaching out regarding a business development opportunity that could benefit {store_name}.
-
-{business_description}
-
-After researching your service center, I believe there's potential for a mutually beneficial partnership. We specialize in robotics automation and are actively seeking to collaborate with established Kirby service centers like yours.
-
-**Partnership Benefits:**
-• Increased revenue through new service offerings
-• Access to cutting-edge automation technology
-• Enhanced customer satisfaction and retention
-
-**Our Track Record:**
-• Successfully implemented automation solutions for 50+ businesses
-• 95% client satisfaction rate
-• 40% average efficiency improvement
-
-I'd love to schedule a brief call to discuss this opportunity in detail. Would you be available for a 20-minute conversation this week?
-
-Thank you for considering this partnership opportunity.
-
-Best regards,
-{sender_name}
-{company_name}
-Phone: {phone_number}
-Website: {website}
-        """,
+        "path": os.path.join(TEMPLATES_DIR, "kirby_business_development.txt"),
         "variables": ["name", "store_name", "sender_name", "business_description", "company_name", "phone_number", "website"]
     },
     
     "angel_outreach": {
         "subject": "Angel Investment Opportunity - {company_name} Update",
-        "template": """
-Hi {name},
-
-A quick update from our side, and all of this has happened just in the last few weeks: 
-
-• Company is officially incorporated 
-• We've finalized a live+work villa setup in Bangalore, [work-eat-sleep-repeat]
-• Team's in motion: 4 interns onboarded, 2 full-time engineers joining soon
-• Procurement for key hardware is underway
-• MVP will be ready in 2 months[week-wise dev plan ready with contingency], and we kick off our first real-world pilot in Month 3 (in Bangalore), in a banglore it company washroom 
-
-We're raising a ₹1.5–2 Cr angel round, got some commitment already, with ₹20L as minimum cheque size.
-
-Would deeply appreciate if you could connect us with any angels who can bring patient capital to back a deeptech startup from India, for the world.
-
-Will send over our updated vision slide + demo videos right after this — feel free to forward them!
-
-Thanks a lot for your continued support 🙏
-
-{sender_name}
-({company_name})
-        """,
+        "path": os.path.join(TEMPLATES_DIR, "angel_outreach.txt"),
         "variables": ["name", "sender_name", "company_name"]
     }
 }
@@ -142,9 +49,13 @@ Thanks a lot for your continued support 🙏
 CAMPAIGN_SETTINGS = {
     "default_template": "kirby_partnership",
     "batch_size": 10,  # Send emails in batches to avoid rate limits
-    "delay_between_batches": 60,  # Seconds between batches
-    "delay_between_emails": 5,  # Seconds between individual emails
+    "rate_limit_rps": 2,  # Gmail API sends per second (messages.send costs 100 of 250 quota units/sec)
     "max_emails_per_day": 100,  # Gmail sending limits
+    "rate_per_min": 20,  # Average sends per minute for SMTP campaigns
+    "burst": 5,  # Sends allowed back-to-back before rate limiting kicks in
+    "concurrency": 5,  # Parallel SMTP connections for campaigns (Gmail-safe)
+    "async_send": False,  # Send concurrently on asyncio (aiohttp for the Gmail API, aiosmtplib for SMTP)
+    "max_concurrency": 10,  # Gmail API requests in flight at once (batch worker threads or async sends)
     "test_mode": True,  # Set to False for actual sending
     "test_email": "",  # Your email for testing
 }
@@ -236,9 +147,31 @@ Required Python packages:
 pip install google-auth google-auth-oauthlib google-auth-httplib2 google-api-python-client
 """
 
+def compile_template(template: str) -> Callable[[Dict], str]:
+    """Parse a str.format template once and return a render(context) function"""
+    parts = []
+    for literal, field, spec, conversion in string.Formatter().parse(template):
+        if field is not None and (spec or conversion or not field.isidentifier()):
+            return template.format_map
+        parts.append((literal, field))
+    parts = tuple(parts)
+    
+    def render(context: Dict) -> str:
+        return ''.join([literal + str(context[field]) if field is not None else literal
+                        for literal, field in parts])
+    
+    return render
+
+@lru_cache(maxsize=None)
 def get_template(template_name: str) -> Dict:
-    """Get email template by name"""
-    return EMAIL_TEMPLATES.get(template_name, EMAIL_TEMPLATES["kirby_partnership"])
+    """Get email template by name, with render functions under _compiled_subject/_compiled_template"""
+    template = dict(EMAIL_TEMPLATES.get(template_name, EMAIL_TEMPLATES["kirby_partnership"]))
+    if "template" not in template:
+        with open(template["path"], encoding="utf-8", newline="") as file:
+            template["template"] = file.read()
+    template["_compiled_subject"] = compile_template(template["subject"])
+    template["_compiled_template"] = compile_template(template["template"])
+    return template
 
 def get_campaign_settings() -> Dict:
     """Get campaign settings"""
@@ -5,9 +5,23 @@ Extracts email addresses and names for email outreach campaigns.
 """
 
 import csv
+import os
 import re
 import sys
-from typing import List, Dict, Tuple
+import tempfile
+from collections import Counter
+from functools import lru_cache
+from itertools import chain
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+# Patterns compiled once at import rather than looked up on every row
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+_WS_RE = re.compile(r'\s+')
+_PUNCT_RE = re.compile(r'[^\w\s]')
+_SUFFIX_RE = re.compile(r'\b(?:vacuum|service|center|repair|sales|store|shop)\b')  # Whole words only
+
+SAMPLE_SIZE = 5  # Contacts shown in the extraction summary
+MAX_EMAIL_LENGTH = 254  # Longest valid address per RFC 5321
 
 def clean_email(email: str) -> str:
     """Clean and validate email address"""
@@ -17,102 +31,108 @@ def clean_email(email: str) -> str:
     # Remove extra whitespace
     email = email.strip()
     
+    # Cheap rejects before the regex: no '@' or '.', or longer than the RFC 5321 limit
+    if '@' not in email or '.' not in email or len(email) > MAX_EMAIL_LENGTH:
+        return ""
+    
     # Basic email validation
-    email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    if re.match(email_pattern, email):
+    if _EMAIL_RE.match(email):
         return email.lower()
     return ""
 
+@lru_cache(maxsize=4096)  # Chain and franchise store names repeat across cities
 def extract_name_from_store(store_name: str) -> str:
     """Extract potential contact name from store name"""
     if not store_name:
         return ""
     
-    # Remove common business suffixes
-    suffixes = ['vacuum', 'service', 'center', 'repair', 'sales', 'store', 'shop']
-    name = store_name.lower()
-    
-    for suffix in suffixes:
-        name = name.replace(suffix, '').strip()
+    # Remove common business suffixes in one pass
+    name = _SUFFIX_RE.sub('', store_name.lower())
     
     # Clean up extra spaces and punctuation
-    name = re.sub(r'\s+', ' ', name)
-    name = re.sub(r'[^\w\s]', '', name)
+    name = _WS_RE.sub(' ', name)
+    name = _PUNCT_RE.sub('', name).strip()
     
     return name.title() if name else ""
 
-def extract_contacts_from_csv(csv_file: str) -> List[Dict]:
-    """Extract email addresses and names from CSV file"""
-    contacts = []
-    
-    try:
-        with open(csv_file, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
+def _cell(row: List[str], index) -> str:
+    """Value at a column position, or '' when the column or the cell is missing"""
+    if index is None or index >= len(row):
+        return ""
+    return row[index]
+
+def extract_contacts_from_csv(csv_file: str) -> Iterator[Dict]:
+    """Yield contacts with an email address from CSV file, one row at a time; read errors propagate"""
+    with open(csv_file, 'r', encoding='utf-8', newline='') as file:
+        reader = csv.reader(file)
+        
+        # Resolve column positions once; rows are then plain lists indexed by position
+        columns = {field: i for i, field in enumerate(next(reader, []))}
+        email_col = columns.get('Email')
+        name_col = columns.get('Name')
+        street_col = columns.get('Street')
+        city_col = columns.get('City/State/Zip')
+        phone_col = columns.get('Phone')
+        distance_col = columns.get('Distance')
+        
+        for row in reader:
+            # Extract email directly from Email column
+            email = clean_email(_cell(row, email_col))
             
-            for row in reader:
-                # Extract email directly from Email column
-                email = row.get('Email', '').strip()
-                email = clean_email(email)
-                
-                # Extract store name from Name column
-                store_name = row.get('Name', '').strip()
-                name = extract_name_from_store(store_name)
-                
-                # Only add if we have an email
-                if email:
-                    contact = {
-                        'email': email,
-                        'name': name,
-                        'store_name': store_name,
-                        'address': f"{row.get('Street', '')}, {row.get('City/State/Zip', '')}",
-                        'phone': row.get('Phone', ''),
-                        'distance': row.get('Distance', ''),
-                        'location': row.get('City/State/Zip', '').split(',')[0] if row.get('City/State/Zip') else ''
-                    }
-                    contacts.append(contact)
-    
-    except FileNotFoundError:
-        print(f"Error: CSV file '{csv_file}' not found.")
-        return []
-    except Exception as e:
-        print(f"Error reading CSV file: {e}")
-        return []
-    
-    return contacts
+            # Only yield if we have an email
+            if not email:
+                continue
+            
+            # Extract store name from Name column
+            store_name = _cell(row, name_col).strip()
+            name = extract_name_from_store(store_name)
+            
+            city_state_zip = _cell(row, city_col)
+            yield {
+                'email': email,
+                'name': name,
+                'store_name': store_name,
+                'address': f"{_cell(row, street_col)}, {city_state_zip}",
+                'phone': _cell(row, phone_col),
+                'distance': _cell(row, distance_col),
+                'location': city_state_zip.split(',')[0] if city_state_zip else ''
+            }
 
-def save_contacts_to_csv(contacts: List[Dict], output_file: str):
-    """Save extracted contacts to a new CSV file"""
-    if not contacts:
-        print("No contacts to save.")
-        return
-    
+def save_contacts_to_csv(contacts: Iterable[Dict], output_file: str) -> int:
+    """Stream extracted contacts into a new CSV file; returns how many were written"""
     fieldnames = ['email', 'name', 'store_name', 'address', 'phone', 'distance', 'location']
-    
-    try:
-        with open(output_file, 'w', newline='', encoding='utf-8') as file:
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
+    written = 0
+    
+    def counted(rows):
+        nonlocal written
+        for row in rows:
+            written += 1
+            yield row
+    
+    # Written to a temporary file that replaces output_file only once every row is in it
+    with tempfile.NamedTemporaryFile('w', newline='', encoding='utf-8', suffix='.tmp', delete=False,
+                                     dir=os.path.dirname(os.path.abspath(output_file))) as tmp:
+        try:
+            writer = csv.DictWriter(tmp, fieldnames=fieldnames)
             writer.writeheader()
-            writer.writerows(contacts)
-        
-        print(f"✅ Successfully saved {len(contacts)} contacts to '{output_file}'")
-    
-    except Exception as e:
-        print(f"Error saving contacts: {e}")
+            writer.writerows(counted(contacts))
+        except BaseException:
+            tmp.close()
+            os.remove(tmp.name)
+            raise
+    os.replace(tmp.name, output_file)
+    
+    print(f"✅ Successfully saved {written} contacts to '{output_file}'")
+    return written
 
-def print_contact_summary(contacts: List[Dict]):
+def print_contact_summary(total: int, location_counts: Counter, sample: List[Dict]):
     """Print summary of extracted contacts"""
-    if not contacts:
+    if not total:
         print("❌ No valid email contacts found.")
         return
     
     print(f"\n📊 Contact Extraction Summary:")
-    print(f"   Total contacts with emails: {len(contacts)}")
-    
-    # Count by location
-    location_counts = {}
-    for contact in contacts:
-        location = contact.get('location', 'Unknown')
-        location_counts[location] = location_counts.get(location, 0) + 1
+    print(f"   Total contacts with emails: {total}")
     
     print(f"   Contacts by location:")
     for location, count in sorted(location_counts.items()):
@@ -120,7 +140,7 @@ def print_contact_summary(contacts: List[Dict]):
     
     # Show sample contacts
     print(f"\n📧 Sample contacts:")
-    for i, contact in enumerate(contacts[:5]):
+    for i, contact in enumerate(sample):
         print(f"   {i+1}. {contact['name']} ({contact['email']}) - {contact['store_name']}")
 
 def main():
@@ -135,19 +155,40 @@ def main():
     
     print(f"🔍 Extracting contacts from '{csv_file}'...")
     
-    # Extract contacts
-    contacts = extract_contacts_from_csv(csv_file)
+    if not os.path.isfile(csv_file):
+        print(f"Error: CSV file '{csv_file}' not found.")
+        sys.exit(1)
+    
+    # One pass over the source: rows are written as they are read while the summary is tallied
+    location_counts = Counter()
+    sample = []
     
-    if contacts:
-        # Print summary
-        print_contact_summary(contacts)
+    def tally(rows):
+        for contact in rows:
+            location_counts[contact.get('location', 'Unknown')] += 1
+            if len(sample) < SAMPLE_SIZE:
+                sample.append(contact)
+            yield contact
+    
+    try:
+        # Extract contacts
+        contacts = extract_contacts_from_csv(csv_file)
+        first = next(contacts, None)
         
-        # Save to new CSV
-        save_contacts_to_csv(contacts, output_file)
+        if first is None:
+            print("❌ No valid email contacts found in the CSV file.")
+            return
         
-        print(f"\n📁 Contact file ready for email outreach: '{output_file}'")
-    else:
-        print("❌ No valid email contacts found in the CSV file.")
+        total = save_contacts_to_csv(tally(chain([first], contacts)), output_file)
+    except (OSError, csv.Error, UnicodeDecodeError) as e:
+        # A file that fails partway must not be reported as a finished extraction
+        print(f"❌ Error extracting contacts: {e}")
+        sys.exit(1)
+    
+    # Print summary
+    print_contact_summary(total, location_counts, sample)
+    
+    print(f"\n📁 Contact file ready for email outreach: '{output_file}'")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,14 +1,292 @@
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from bs4 import BeautifulSoup
+from lxml import html
+from html import unescape
+import requests
 import csv
+import os
 import time
 import sys
-from config import get_config, list_configs
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from config import get_config
+
+URL = "https://www.kirby.com/kirby-owner-support/find-a-kirby-service-center/"
+# The store locator (WP Store Locator plugin) loads its results from this JSON endpoint
+AJAX_URL = "https://www.kirby.com/wp-admin/admin-ajax.php"
+GEOCODE_URL = "https://nominatim.openstreetmap.org/search"
+GEOCODE_INTERVAL = 1.0  # Nominatim's usage policy allows at most one request per second
+HTTP_TIMEOUT = 20
+DISTANCE_UNIT = "mi"  # Unit the store locator shows distances in
+USER_AGENT = "kirby-service-center-scraper"
+SCRAPE_WORKERS = 4  # Headless Chrome instances searching locations in parallel
+# Sets the radius and max-results dropdowns and fires their change events (synchronously)
+SET_SEARCH_OPTIONS_JS = """
+    var radius = document.getElementById('wpsl-radius-dropdown');
+    radius.value = arguments[0];
+    radius.dispatchEvent(new Event('change'));
+    var results = document.getElementById('wpsl-results-dropdown');
+    results.value = arguments[1];
+    results.dispatchEvent(new Event('change'));
+"""
+CSV_HEADER = ["Name", "Street", "City/State/Zip", "Country", "Phone", "Email", "Distance", "Directions Link"]
+# One scraped listing, in CSV_HEADER order (a tuple is iterable, so csv.writer takes it as a row)
+Store = namedtuple("Store", "name street city_state_zip country phone email distance directions_link")
+
+# Elements a store listing is built from, keyed by (tag, CSS class)
+STORE_PARTS = {
+    ("span", "wpsl-street"): "street",
+    ("span", "wpsl-country"): "country",
+    ("p", "wpsl-contact-details"): "contact",
+    ("div", "wpsl-direction-wrap"): "direction",
+}
+
+def _text(element):
+    """Element text joined the way BeautifulSoup's get_text(strip=True) does"""
+    return "".join(part.strip() for part in element.itertext())
+
+def parse_stores(page_source):
+    """Yield (store_id, Store) for each store listing, from a single lxml parse of the page"""
+    tree = html.fromstring(page_source)
+    for store in tree.iterfind(".//li[@data-store-id]"):
+        parts = {}
+        for element in store.iter("strong", "span", "p", "div"):
+            if element.tag == "strong":
+                parts.setdefault("name", element)
+                continue
+            for css_class in element.get("class", "").split():
+                key = STORE_PARTS.get((element.tag, css_class))
+                if key:
+                    parts.setdefault(key, element)
+        
+        name = _text(parts["name"]) if "name" in parts else ""
+        street = ""
+        city_state_zip = ""
+        street_span = parts.get("street")
+        if street_span is not None:
+            street = _text(street_span)
+            next_span = next(street_span.itersiblings("span"), None)
+            if next_span is not None:
+                city_state_zip = _text(next_span)
+        country = _text(parts["country"]) if "country" in parts else ""
+        phone = ""
+        email = ""
+        contact = parts.get("contact")
+        if contact is not None:
+            for span in contact.iter("span"):
+                span_text = _text(span)  # Walk each contact span once for both checks
+                if "Phone" in span_text:
+                    phone = span_text.replace("Phone:", "").strip()
+                if "Email" in span_text:
+                    email = span_text.replace("Email:", "").strip()
+        distance = ""
+        directions_link = ""
+        direction_wrap = parts.get("direction")
+        if direction_wrap is not None:
+            distance = _text(direction_wrap).split("Directions")[0].strip()
+            a_tag = next(direction_wrap.iter("a"), None)
+            if a_tag is not None:
+                directions_link = a_tag.get("href", "")
+                if directions_link == "#":
+                    directions_link = ""  # Directions shown on the page's map, not a link
+        yield store.get("data-store-id"), Store(name, street, city_state_zip, country, phone, email, distance, directions_link)
+
+def _json_text(result, key):
+    """A store field from the JSON response, with HTML entities decoded"""
+    return unescape(str(result.get(key) or "")).strip()
+
+_geocode_lock = threading.Lock()
+_geocode_cache = {}
+_last_geocode = 0.0
+
+def geocode(session, location):
+    """Look up (lat, lng) for a location string, once per run; None if it cannot be found"""
+    global _last_geocode
+    with _geocode_lock:
+        if location not in _geocode_cache:
+            # Serialized and spaced out to respect the geocoder's rate limit
+            wait = _last_geocode + GEOCODE_INTERVAL - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                response = session.get(GEOCODE_URL, params={"q": location, "format": "json", "limit": 1},
+                                       timeout=HTTP_TIMEOUT)
+                response.raise_for_status()
+                results = response.json()
+                _geocode_cache[location] = (results[0]["lat"], results[0]["lon"]) if results else None
+            except (requests.RequestException, ValueError, KeyError) as e:
+                print(f"Warning: Could not geocode {location}: {e}")
+                _geocode_cache[location] = None
+            finally:
+                _last_geocode = time.monotonic()
+        return _geocode_cache[location]
+
+def format_distance(value):
+    """Distance as the store locator page shows it (e.g. "4.2 mi"), rounded the way its script rounds"""
+    try:
+        distance = float(value)
+    except (TypeError, ValueError):
+        return ""
+    return f"{distance:.1f} {DISTANCE_UNIT}" if distance < 10 else f"{round(distance)} {DISTANCE_UNIT}"
+
+def format_city_state_zip(city, state, zip_code):
+    """City, state and zip joined like the page's address line, without separators for missing parts"""
+    state_zip = " ".join(part for part in (state, zip_code) if part)
+    return ", ".join(part for part in (city, state_zip) if part)
+
+# Set once the JSON endpoint answers in a shape we can't read, so later locations go
+# straight to the browser instead of geocoding and querying an endpoint that won't work
+_json_endpoint_disabled = threading.Event()
+
+def _disable_json_endpoint(reason):
+    """Stop using the JSON endpoint for the rest of the run, saying why"""
+    if not _json_endpoint_disabled.is_set():
+        _json_endpoint_disabled.set()
+        print(f"Warning: Store search endpoint {reason}; using Selenium for the remaining locations")
+
+def fetch_stores_json(session, location, config):
+    """Search one location through the store locator's JSON endpoint; None means fall back to Selenium"""
+    if _json_endpoint_disabled.is_set():
+        return None
+    coordinates = geocode(session, location)
+    if coordinates is None:
+        return None
+    lat, lng = coordinates
+    # The endpoint isn't documented: these are the parameters the locator's own script sends
+    params = {
+        "action": "store_search",
+        "lat": lat,
+        "lng": lng,
+        "max_results": config["max_results"],
+        "search_radius": config["search_radius"],
+        "autoload": 0,
+    }
+    try:
+        response = session.get(AJAX_URL, params=params, timeout=HTTP_TIMEOUT)
+        response.raise_for_status()
+        results = response.json()
+    except (requests.RequestException, ValueError) as e:
+        print(f"Warning: Store search endpoint failed for {location}: {e}")
+        return None
+    if not isinstance(results, list):
+        # admin-ajax answers 0 or -1 when it doesn't recognise the action or its parameters
+        _disable_json_endpoint(f"returned {str(results)[:40]!r} instead of a store list")
+        return None
+    if not results:
+        # Parameters the endpoint ignores also come back as an empty list, so let the page confirm it
+        print(f"Store search endpoint found no stores for {location}; checking with Selenium")
+        return None
+    
+    stores = []
+    for result in results:
+        if not isinstance(result, dict) or "id" not in result or "store" not in result:
+            _disable_json_endpoint("returned stores in an unknown format")
+            return None
+        field = lambda key: _json_text(result, key)
+        street = ", ".join(part for part in (field("address"), field("address2")) if part)
+        city_state_zip = format_city_state_zip(field("city"), field("state"), field("zip"))
+        # The page builds its directions links in the browser, so the JSON has none to copy
+        stores.append((str(result["id"]), Store(field("store"), street, city_state_zip, field("country"),
+                                                field("phone"), field("email"), format_distance(result.get("distance")), "")))
+    print(f"Found {len(stores)} stores for {location}")
+    return stores
+
+def new_driver():
+    """Start a headless Chrome for one scraper worker"""
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    return webdriver.Chrome(options=chrome_options)
+
+def scrape_location(driver, location, config):
+    """Search one location on the store locator and return its (store_id, Store) listings"""
+    wait = WebDriverWait(driver, 20)  # Wait up to 20 seconds
+    driver.get(URL)
+    # Continue as soon as the store locator form is on the page
+    try:
+        wait.until(EC.presence_of_element_located((By.ID, "wpsl-search-input")))
+    except TimeoutException:
+        print(f"Warning: Store locator did not load for {location}")
+    
+    # Dismiss cookie consent popup if present (try multiple ways)
+    popup_closed = False
+    try:
+        # Try by ID
+        accept_btn = driver.find_element(By.ID, "hs-eu-confirmation-button")
+        accept_btn.click()
+        time.sleep(1)
+        popup_closed = True
+    except Exception:
+        pass
+    if not popup_closed:
+        try:
+            # Try by class name
+            accept_btn = driver.find_element(By.CLASS_NAME, "hs-eu-confirmation-button")
+            accept_btn.click()
+            time.sleep(1)
+            popup_closed = True
+        except Exception:
+            pass
+    if not popup_closed:
+        try:
+            # Try by button text
+            buttons = driver.find_elements(By.TAG_NAME, "button")
+            for btn in buttons:
+                if "accept" in btn.text.lower() or "agree" in btn.text.lower():
+                    btn.click()
+                    time.sleep(1)
+                    popup_closed = True
+                    break
+        except Exception:
+            pass
+    if not popup_closed:
+        # As a last resort, remove overlays with JS
+        driver.execute_script('''
+            var overlays = document.querySelectorAll('[id*="cookie"], [class*="cookie"], [id*="consent"], [class*="consent"]');
+            overlays.forEach(function(el) { el.remove(); });
+        ''')
+        time.sleep(1)
+    
+    # Set search radius and max results in one script round trip
+    try:
+        driver.execute_script(SET_SEARCH_OPTIONS_JS, config['search_radius'], config['max_results'])
+    except Exception as e:
+        print(f"Warning: Could not set search options: {e}")
+    
+    # Enter location
+    try:
+        search_input = wait.until(EC.presence_of_element_located((By.ID, "wpsl-search-input")))
+        search_input.clear()
+        search_input.send_keys(location)
+        
+        # Click search
+        search_btn = wait.until(EC.element_to_be_clickable((By.ID, "wpsl-search-btn")))
+        try:
+            search_btn.click()
+        except Exception as e:
+            # Try JavaScript click as fallback
+            driver.execute_script("arguments[0].click();", search_btn)
+        
+        # Wait for dynamic content to load, returning as soon as listings appear
+        print(f"Waiting for results to load for {location}...")
+        try:
+            stores = wait.until(lambda d: d.find_elements(By.CSS_SELECTOR, "li[data-store-id]"))
+            print(f"Found {len(stores)} stores for {location}")
+        except TimeoutException:
+            print(f"No stores found for {location}")
+        
+        # Parse results
+        return list(parse_stores(driver.page_source))
+            
+    except Exception as e:
+        print(f"Error processing {location}: {e}")
+        return []
 
 def main():
     """Main function to run the Kirby scraper with configurable parameters"""
@@ -32,190 +310,65 @@ def main():
     print(f"Max Results: {config['max_results']}")
     print()
     
-    # Initialize browser
-    chrome_options = Options()
-    chrome_options.add_argument("--headless")
-    chrome_options.add_argument("--no-sandbox")
-    chrome_options.add_argument("--disable-dev-shm-usage")
+    # Use a set to deduplicate by store id
+    unique_stores = set()
 
-    driver = webdriver.Chrome(options=chrome_options)
-    wait = WebDriverWait(driver, 20)  # Wait up to 20 seconds
+    # Stores are appended as they are found, so an interrupted run keeps what it scraped
+    filename = f"kirby_service_centers_{config_name}.csv"
+    partial_filename = f"kirby_service_centers_{config_name}.partial.csv"
+    total_searches = len(config['locations'])
 
-    url = "https://www.kirby.com/kirby-owner-support/find-a-kirby-service-center/"
+    # Each worker thread keeps its own HTTP session, and lazily starts its own browser
+    # (reused for every location it takes) only if the JSON endpoint cannot be used
+    local = threading.local()
+    drivers = []
+    drivers_lock = threading.Lock()
 
-    # Use a set to deduplicate by store id
-    unique_stores = dict()
+    def scrape_one(location):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+            session.headers["User-Agent"] = USER_AGENT
+        print(f"Searching for: {location}")
+        stores = fetch_stores_json(session, location, config)
+        if stores is not None:
+            return stores
+        print(f"Falling back to Selenium for {location}")
+        driver = getattr(local, "driver", None)
+        if driver is None:
+            driver = local.driver = new_driver()
+            with drivers_lock:
+                drivers.append(driver)
+        return scrape_location(driver, location, config)
 
-    total_searches = len(config['locations'])
-    current_search = 0
+    try:
+        with open(partial_filename, "w", newline="", encoding="utf-8") as csvfile, \
+                ThreadPoolExecutor(max_workers=SCRAPE_WORKERS) as executor:
+            writer = csv.writer(csvfile)
+            writer.writerow(CSV_HEADER)
+            futures = {executor.submit(scrape_one, location): location for location in config['locations']}
+            # Results are merged and written here on the main thread, so no locking is needed
+            for current_search, future in enumerate(as_completed(futures), 1):
+                location = futures[future]
+                try:
+                    stores = future.result()
+                except Exception as e:
+                    print(f"Error processing {location}: {e}")
+                    stores = []
+                for store_id, row in stores:
+                    if store_id not in unique_stores:
+                        unique_stores.add(store_id)
+                        writer.writerow(row)
+                csvfile.flush()
+                print(f"Progress: {current_search}/{total_searches} - Finished: {location}")
+    finally:
+        for driver in drivers:
+            driver.quit()
+
+    # All locations done: the partial file becomes the final CSV
+    os.replace(partial_filename, filename)
 
-    for location in config['locations']:
-        current_search += 1
-        print(f"Progress: {current_search}/{total_searches} - Searching for: {location}")
-        driver.get(url)
-        time.sleep(3)
-        
-        # Dismiss cookie consent popup if present (try multiple ways)
-        popup_closed = False
-        try:
-            # Try by ID
-            accept_btn = driver.find_element(By.ID, "hs-eu-confirmation-button")
-            accept_btn.click()
-            time.sleep(1)
-            popup_closed = True
-        except Exception:
-            pass
-        if not popup_closed:
-            try:
-                # Try by class name
-                accept_btn = driver.find_element(By.CLASS_NAME, "hs-eu-confirmation-button")
-                accept_btn.click()
-                time.sleep(1)
-                popup_closed = True
-            except Exception:
-                pass
-        if not popup_closed:
-            try:
-                # Try by button text
-                buttons = driver.find_elements(By.TAG_NAME, "button")
-                for btn in buttons:
-                    if "accept" in btn.text.lower() or "agree" in btn.text.lower():
-                        btn.click()
-                        time.sleep(1)
-                        popup_closed = True
-                        break
-            except Exception:
-                pass
-        if not popup_closed:
-            # As a last resort, remove overlays with JS
-            driver.execute_script('''
-                var overlays = document.querySelectorAll('[id*="cookie"], [class*="cookie"], [id*="consent"], [class*="consent"]');
-                overlays.forEach(function(el) { el.remove(); });
-            ''')
-            time.sleep(1)
-        
-        # Set search radius
-        try:
-            radius_dropdown = driver.find_element(By.ID, "wpsl-radius-dropdown")
-            driver.execute_script(f"arguments[0].value = '{config['search_radius']}';", radius_dropdown)
-            # Trigger change event
-            driver.execute_script("arguments[0].dispatchEvent(new Event('change'));", radius_dropdown)
-            time.sleep(1)
-        except Exception as e:
-            print(f"Warning: Could not set search radius: {e}")
-        
-        # Set max results
-        try:
-            results_dropdown = driver.find_element(By.ID, "wpsl-results-dropdown")
-            driver.execute_script(f"arguments[0].value = '{config['max_results']}';", results_dropdown)
-            # Trigger change event
-            driver.execute_script("arguments[0].dispatchEvent(new Event('change'));", results_dropdown)
-            time.sleep(1)
-        except Exception as e:
-            print(f"Warning: Could not set max results: {e}")
-        
-        # Enter location
-        try:
-            search_input = wait.until(EC.presence_of_element_located((By.ID, "wpsl-search-input")))
-            search_input.clear()
-            search_input.send_keys(location)
-            
-            # Click search
-            search_btn = wait.until(EC.element_to_be_clickable((By.ID, "wpsl-search-btn")))
-            try:
-                search_btn.click()
-            except Exception as e:
-                # Try JavaScript click as fallback
-                driver.execute_script("arguments[0].click();", search_btn)
-            
-            # Wait for dynamic content to load
-            print(f"Waiting for results to load for {location}...")
-            time.sleep(10)  # Initial wait
-            
-            # Check if store data has loaded
-            max_attempts = 5
-            for attempt in range(max_attempts):
-                soup = BeautifulSoup(driver.page_source, "html.parser")
-                stores = soup.find_all("li", attrs={"data-store-id": True})
-                
-                if stores:
-                    print(f"Found {len(stores)} stores for {location}")
-                    break
-                else:
-                    print(f"Attempt {attempt + 1}: No stores found, waiting...")
-                    time.sleep(5)
-                    # Try clicking search again if no results
-                    if attempt < max_attempts - 1:
-                        try:
-                            search_btn = driver.find_element(By.ID, "wpsl-search-btn")
-                            driver.execute_script("arguments[0].click();", search_btn)
-                        except:
-                            pass
-            
-            # Parse results
-            soup = BeautifulSoup(driver.page_source, "html.parser")
-            stores = soup.find_all("li", attrs={"data-store-id": True})
-            
-            for store in stores:
-                store_id = store.get("data-store-id")
-                if store_id in unique_stores:
-                    continue
-                name = store.find("strong").get_text(strip=True) if store.find("strong") else ""
-                street = store.find("span", class_="wpsl-street").get_text(strip=True) if store.find("span", class_="wpsl-street") else ""
-                city_state_zip = ""
-                street_span = store.find("span", class_="wpsl-street")
-                if street_span:
-                    next_span = street_span.find_next_sibling("span")
-                    if next_span:
-                        city_state_zip = next_span.get_text(strip=True)
-                country = store.find("span", class_="wpsl-country").get_text(strip=True) if store.find("span", class_="wpsl-country") else ""
-                contact = store.find("p", class_="wpsl-contact-details")
-                phone = ""
-                email = ""
-                if contact:
-                    for span in contact.find_all("span"):
-                        if "Phone" in span.get_text():
-                            phone = span.get_text(strip=True).replace("Phone:", "").strip()
-                        if "Email" in span.get_text():
-                            email = span.get_text(strip=True).replace("Email:", "").strip()
-                direction_wrap = store.find("div", class_="wpsl-direction-wrap")
-                distance = ""
-                directions_link = ""
-                if direction_wrap:
-                    distance = direction_wrap.get_text(strip=True).split("Directions")[0].strip()
-                    a_tag = direction_wrap.find("a")
-                    if a_tag:
-                        directions_link = a_tag["href"]
-                unique_stores[store_id] = [name, street, city_state_zip, country, phone, email, distance, directions_link]
-                
-        except Exception as e:
-            print(f"Error processing {location}: {e}")
-            continue
-        
-        # Save intermediate results every 10 searches
-        if current_search % 10 == 0:
-            filename = f"kirby_service_centers_{config_name}_intermediate_{current_search}.csv"
-            with open(filename, "w", newline="", encoding="utf-8") as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow([
-                    "Name", "Street", "City/State/Zip", "Country", "Phone", "Email", "Distance", "Directions Link"
-                ])
-                for row in unique_stores.values():
-                    writer.writerow(row)
-            print(f"Intermediate save: {len(unique_stores)} unique service centers")
-
-    # Save to CSV
-    filename = f"kirby_service_centers_{config_name}.csv"
-    with open(filename, "w", newline="", encoding="utf-8") as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow([
-            "Name", "Street", "City/State/Zip", "Country", "Phone", "Email", "Distance", "Directions Link"
-        ])
-        for row in unique_stores.values():
-            writer.writerow(row)
-
-    driver.quit()
     print(f"Scraping complete! {len(unique_stores)} unique service centers saved to {filename}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
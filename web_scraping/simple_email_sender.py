@@ -5,188 +5,847 @@ Bypasses Gmail API OAuth issues
 """
 
 import smtplib
+import asyncio
 import csv
 import time
 import os
 import base64
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email.mime.image import MIMEImage
-from email import encoders
-from email_config import get_template, GMAIL_CONFIG
+import logging
+import binascii
+import mmap
+import queue
+import random
+import re
+import socket
+import sqlite3
+import ssl
+import sys
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import lru_cache
+from email import policy
+from email.message import EmailMessage, MIMEPart
+from email_config import get_template, GMAIL_CONFIG, CAMPAIGN_SETTINGS
 from dotenv import load_dotenv
 
+# Optional: only needed for the asyncio sender (CAMPAIGN_SETTINGS["async_send"])
+try:
+    import aiosmtplib
+except ImportError:
+    aiosmtplib = None
+
+try:
+    import pybase64  # SIMD base64 for attachments; base64_lines falls back to binascii without it
+except ImportError:
+    pybase64 = None
+
 # Load environment variables
 load_dotenv()
 
-def send_email_smtp(to_email, subject, body, sender_email, sender_password, attachments=None, html_body=None, embedded_images=None):
-    """Send email using SMTP with optional attachments and embedded images"""
+logger = logging.getLogger(__name__)
+
+SMTP_HOST = 'smtp.gmail.com'
+SMTP_PORT = 587
+MAX_MESSAGES_PER_CONNECTION = 100  # Rotate connections to release server-side resources
+RETRYABLE_SMTP_CODES = (421, 450, 554)  # Transient throttling / try-again-later replies
+MAX_SEND_RETRIES = 3
+FAILURE_WINDOW = 30  # Recent sends considered when deciding to abandon a campaign
+MAX_FAILURE_RATIO = 1 / 3  # Abandon once more than this share of the recent sends failed
+EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')  # Cheap shape check before spending an SMTP round trip
+PROGRESS_EVERY = 100  # Sends between campaign progress lines; per-message lines are logged at DEBUG
+IDLE_CHECK_SECONDS = 30  # Only NOOP-check a connection that has sat idle at least this long
+SENT_LOG_FILE = 'campaign.db'  # SQLite record of addresses sent by unfinished campaigns
+SENT_LOG_BATCH = 50  # Sent addresses committed per transaction; a crash re-sends at most this many
+# Contact CSV columns read by the bulk senders, with the value used when one is missing
+CONTACT_COLUMNS = (('email', ''), ('name', 'there'), ('store_name', 'your service center'))
+FAILED_FIELDS = ('email', 'name', 'store_name', 'error')  # Skipped-contacts file columns, as in bulk_email_sender
+# (maintype, subtype) for attachments by file extension; others are sent as application/octet-stream
+ATTACHMENT_TYPES = {
+    '.pdf': ('application', 'pdf'),
+    '.doc': ('application', 'msword'),
+    '.docx': ('application', 'vnd.openxmlformats-officedocument.wordprocessingml.document'),
+    '.zip': ('application', 'zip'),
+    '.rar': ('application', 'x-rar-compressed'),
+    '.7z': ('application', 'x-7z-compressed'),
+    '.xls': ('application', 'vnd.ms-excel'),
+    '.xlsx': ('application', 'vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    '.txt': ('text', 'plain'),
+}
+# image/* subtypes for embedded images by file extension; others are sent as application/octet-stream
+IMAGE_SUBTYPES = {'.jpg': 'jpeg', '.jpeg': 'jpeg', '.png': 'png', '.gif': 'gif'}
+# CRLF line endings for the wire, and quoted-printable/base64 rather than raw 8bit for non-ASCII text
+MESSAGE_POLICY = policy.SMTP.clone(cte_type='7bit')
+BASE64_LINE_LENGTH = 76  # RFC 2045 limit for base64 body lines
+BASE64_CHUNK_SIZE = 57 * 1024  # Input bytes encoded per call: whole 57-byte lines, ~57 KB
+MMAP_THRESHOLD = 1 << 20  # Attachments at least this large are memory-mapped instead of read
+DNS_TTL = 300  # Seconds a resolved SMTP server address is reused before looking it up again
+TLS_CONTEXT = ssl.create_default_context()  # STARTTLS verifies the server certificate for SMTP_HOST
+
+_resolved = {}  # (host, port) -> (IP addresses in the order to try them, monotonic expiry time)
+_resolved_lock = threading.Lock()
+
+def resolve_host(host, port):
+    """IP addresses for ``host`` in getaddrinfo order, looked up at most once per DNS_TTL seconds"""
+    now = time.monotonic()
+    with _resolved_lock:
+        cached = _resolved.get((host, port))
+    if cached and cached[1] > now:
+        return cached[0]
+    addresses = tuple(dict.fromkeys(info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)))
+    with _resolved_lock:
+        _resolved[(host, port)] = (addresses, now + DNS_TTL)
+    return addresses
+
+def demote_address(host, port, address):
+    """Move an address that failed to connect to the back of ``host``'s cached list"""
+    with _resolved_lock:
+        cached = _resolved.get((host, port))
+        if cached and address in cached[0]:
+            addresses = tuple(other for other in cached[0] if other != address) + (address,)
+            _resolved[(host, port)] = (addresses, cached[1])
+
+@lru_cache(maxsize=None)
+def local_hostname():
+    """Name sent in EHLO; smtplib would otherwise run getfqdn()'s reverse lookup on every connection"""
+    return socket.getfqdn()
+
+class SMTPClient(smtplib.SMTP):
+    """smtplib.SMTP that connects to resolve_host's addresses and sends with BDAT when the server offers CHUNKING"""
+
+    def _get_socket(self, host, port, timeout):
+        # Try every address in turn, as socket.create_connection does for a hostname.
+        # _host stays the hostname, so STARTTLS still uses it for SNI and the certificate check.
+        error = None
+        for address in resolve_host(host, port):
+            try:
+                return super()._get_socket(address, port, timeout)
+            except OSError as e:
+                demote_address(host, port, address)
+                error = e
+        if error is None:
+            raise OSError(f"no addresses for {host}")
+        raise error
+
+    def data(self, msg):
+        if not self.has_extn('chunking'):
+            return super().data(msg)
+        if isinstance(msg, str):
+            msg = msg.replace('\r\n', '\n').replace('\r', '\n').replace('\n', '\r\n').encode('ascii')
+        self.send(b'BDAT %d LAST\r\n' % len(msg) + msg)
+        return self.getreply()
+
+class SMTPSession:
+    """Persistent, authenticated SMTP connection reused across many sends"""
+
+    def __init__(self, sender_email, sender_password, max_messages=MAX_MESSAGES_PER_CONNECTION):
+        self.sender_email = sender_email
+        self.sender_password = sender_password
+        self.max_messages = max_messages
+        self.server = None
+        self.messages_sent = 0
+        self.last_used = 0.0
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def connect(self):
+        """Open a fresh connection, upgrade to TLS and log in"""
+        self.close()
+        server = SMTPClient(SMTP_HOST, SMTP_PORT, local_hostname=local_hostname())
+        server.starttls(context=TLS_CONTEXT)
+        server.login(self.sender_email, self.sender_password)
+        self.server = server
+        self.messages_sent = 0
+        self.last_used = time.monotonic()
+
+    def close(self):
+        """Quit the current connection if one is open"""
+        if self.server is None:
+            return
+        try:
+            self.server.quit()
+        except (smtplib.SMTPException, OSError):
+            pass  # Connection already dropped
+        self.server = None
+
+    def ensure_connected(self):
+        """Reconnect if the connection was dropped or used up its budget; NOOP-check it only after IDLE_CHECK_SECONDS idle"""
+        if self.server is None or self.messages_sent >= self.max_messages:
+            self.connect()
+            return
+        if time.monotonic() - self.last_used < IDLE_CHECK_SECONDS:
+            return
+        try:
+            self.server.noop()
+        except (smtplib.SMTPServerDisconnected, OSError):
+            self.connect()
+
+    def sendmail(self, from_addr, to_addrs, msg):
+        """Send a message over the shared connection, reconnecting and retrying transient failures with backoff"""
+        for attempt in range(MAX_SEND_RETRIES + 1):
+            self.ensure_connected()
+            try:
+                result = self.server.sendmail(from_addr, to_addrs, msg)
+                break
+            except smtplib.SMTPServerDisconnected:
+                if attempt == MAX_SEND_RETRIES:
+                    raise
+                self.close()
+                # Reconnect at once after the first drop, then back off
+                if attempt:
+                    time.sleep(2 ** attempt)
+            except smtplib.SMTPResponseException as e:
+                if e.smtp_code not in RETRYABLE_SMTP_CODES or attempt == MAX_SEND_RETRIES:
+                    raise
+                if e.smtp_code == 421:
+                    self.close()  # The server is closing this connection
+                time.sleep(2 ** attempt)
+        self.messages_sent += 1
+        self.last_used = time.monotonic()
+        return result
+
+class AsyncSMTPSession:
+    """asyncio counterpart of SMTPSession, built on aiosmtplib"""
+
+    def __init__(self, sender_email, sender_password, max_messages=MAX_MESSAGES_PER_CONNECTION):
+        self.sender_email = sender_email
+        self.sender_password = sender_password
+        self.max_messages = max_messages
+        self.server = None
+        self.messages_sent = 0
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def connect(self):
+        """Open a fresh connection, upgrade to TLS and log in"""
+        await self.close()
+        server = aiosmtplib.SMTP(hostname=SMTP_HOST, port=SMTP_PORT, start_tls=True)
+        await server.connect()
+        await server.login(self.sender_email, self.sender_password)
+        self.server = server
+        self.messages_sent = 0
+
+    async def close(self):
+        """Quit the current connection if one is open"""
+        if self.server is None:
+            return
+        try:
+            await self.server.quit()
+        except (aiosmtplib.SMTPException, OSError):
+            pass  # Connection already dropped
+        self.server = None
+
+    async def sendmail(self, from_addr, to_addrs, msg):
+        """Send a message, reconnecting and retrying the same way SMTPSession does"""
+        for attempt in range(MAX_SEND_RETRIES + 1):
+            if self.server is None or self.messages_sent >= self.max_messages:
+                await self.connect()
+            try:
+                result = await self.server.sendmail(from_addr, to_addrs, msg)
+                break
+            except aiosmtplib.SMTPServerDisconnected:
+                if attempt == MAX_SEND_RETRIES:
+                    raise
+                self.server = None
+                if attempt:
+                    await asyncio.sleep(2 ** attempt)
+            except aiosmtplib.SMTPResponseException as e:
+                if e.code not in RETRYABLE_SMTP_CODES or attempt == MAX_SEND_RETRIES:
+                    raise
+                await asyncio.sleep(2 ** attempt)
+        self.messages_sent += 1
+        return result
+
+class TokenBucket:
+    """Token-bucket rate limiter: bursts of up to ``burst`` sends, ``rate_per_min`` on average"""
+
+    def __init__(self, rate_per_min, burst=1):
+        self.rate = rate_per_min / 60.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """Consume a token and return how many seconds to wait before using it"""
+        if self.rate <= 0:
+            return 0  # Unlimited
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Reserve a token; a negative balance is the time owed before it refills
+            self.tokens -= 1
+            return -self.tokens / self.rate if self.tokens < 0 else 0
+
+    def acquire(self):
+        """Block until a send is allowed, then consume a token"""
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """acquire() for coroutines: waits without blocking the event loop"""
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+def base64_lines(data):
+    """Base64-encode any buffer as 76-character newline-terminated lines, like base64.encodebytes"""
+    if pybase64 is not None:
+        return pybase64.encodebytes(data).decode('ascii')
+    view = memoryview(data)
+    chunks = []
+    for start in range(0, len(view), BASE64_CHUNK_SIZE):
+        encoded = binascii.b2a_base64(view[start:start + BASE64_CHUNK_SIZE], newline=False)
+        chunks.append(b''.join([encoded[i:i + BASE64_LINE_LENGTH] + b'\n'
+                                for i in range(0, len(encoded), BASE64_LINE_LENGTH)]))
+    return b''.join(chunks).decode('ascii')
+
+def base64_file(path):
+    """base64_lines for a file's contents; large files are mapped rather than read into memory"""
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size < MMAP_THRESHOLD:
+            return base64_lines(file.read())
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return base64_lines(mapped)
+
+class FailureWindow:
+    """Outcomes of the last ``size`` sends, to stop a campaign that is mostly failing"""
+
+    def __init__(self, size=FAILURE_WINDOW, max_ratio=MAX_FAILURE_RATIO):
+        self.outcomes = deque(maxlen=size)
+        self.max_ratio = max_ratio
+        self.lock = threading.Lock()
+
+    def record(self, success):
+        """Add a send outcome; returns True once the window is full and too many failed"""
+        with self.lock:
+            self.outcomes.append(success)
+            if len(self.outcomes) < self.outcomes.maxlen:
+                return False
+            failures = self.outcomes.count(False)
+        return failures / len(self.outcomes) > self.max_ratio
+
+class SentLog:
+    """Addresses a campaign has already sent, kept in SQLite so a restart skips them"""
+
+    def __init__(self, campaign, path=SENT_LOG_FILE, batch=SENT_LOG_BATCH):
+        self.campaign = campaign
+        self.batch = batch
+        self.pending = []
+        self.lock = threading.Lock()
+        # Workers record sends from their own threads; the lock serializes them
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS sent '
+                          '(campaign TEXT, email TEXT, ts REAL, PRIMARY KEY (campaign, email))')
+        self.sent = {email for email, in self.conn.execute('SELECT email FROM sent WHERE campaign = ?', (campaign,))}
+
+    def __len__(self):
+        return len(self.sent)
+
+    def __contains__(self, email):
+        return email.lower() in self.sent
+
+    def record(self, email):
+        """Note a successful send; written out with the rest of its batch"""
+        with self.lock:
+            self.sent.add(email.lower())
+            self.pending.append((self.campaign, email.lower(), time.time()))
+            if len(self.pending) >= self.batch:
+                self._flush()
+
+    def _flush(self):
+        with self.conn:
+            self.conn.executemany('INSERT OR IGNORE INTO sent VALUES (?, ?, ?)', self.pending)
+        self.pending.clear()
+
+    def clear(self):
+        """Forget the campaign's sends once it has finished, so a rerun starts over"""
+        with self.lock:
+            self.pending.clear()
+            with self.conn:
+                self.conn.execute('DELETE FROM sent WHERE campaign = ?', (self.campaign,))
+            self.sent.clear()
+
+    def close(self):
+        """Write out any pending sends and close the database"""
+        with self.lock:
+            if self.pending:
+                self._flush()
+            self.conn.close()
+
+class Campaign:
+    """Counts, resume log, failure window and progress shared by a bulk send's producer and workers"""
+
+    def __init__(self, sent_log, counts=None, lock=None):
+        self.sent_log = sent_log
+        self.counts = counts if counts is not None else {'sent': 0, 'failed': 0}
+        self.lock = lock or threading.Lock()  # Guards counts, updated from every worker
+        self.skipped = {'invalid': 0, 'duplicate': 0, 'sent': 0}
+        self.rejected = []  # Invalid and duplicate contacts, with the reason, for the failed_emails file
+        self.failures = FailureWindow()
+        self.aborted = threading.Event()  # Only set and checked, so also safe to use from asyncio code
+        self.started = time.monotonic()
+
+    # log, stopped, stop, progress and skip_sent are overridden by app.py to drive its status page
+    def log(self, message, level='info'):
+        if level == 'error':
+            logger.error(message)
+        else:
+            logger.info(message)
+
+    def stopped(self):
+        return self.aborted.is_set()
+
+    def stop(self, reason):
+        """Stop the campaign: the producer reads no further and workers drain the queue unsent"""
+        self.aborted.set()
+        self.log(f"\n🛑 {reason}", 'error')
+
+    def progress(self, done):
+        """Called with the lock held after every send"""
+        if done % PROGRESS_EVERY == 0:
+            rate = done / max(time.monotonic() - self.started, 1e-6)
+            logger.info("📈 %d processed: %d sent, %d failed (%.1f/s)", done, self.counts['sent'], self.counts['failed'], rate)
+
+    def skip_sent(self, contact):
+        """Count a contact that an earlier run of the campaign already sent"""
+        with self.lock:
+            self.skipped['sent'] += 1
+
+    def jobs(self, contacts, render):
+        """Yield (i, email, render(contact)) for contacts still to send; a render error or None counts as a failure"""
+        for i, contact in enumerate(contacts, 1):
+            if self.stopped():
+                return
+            email = contact[0]
+            if email in self.sent_log:
+                self.skip_sent(contact)
+                continue
+            try:
+                message = render(contact)
+            except Exception as e:
+                self.log(f"❌ Could not build email {i} to {email}: {e}", 'error')
+                message = None
+            if message is None:
+                with self.lock:
+                    self.counts['failed'] += 1
+                continue
+            yield i, email, message
+
+    def record(self, email, error=None):
+        """Count one send's outcome, noting successes in the resume log, and stop if too many recent sends failed"""
+        success = error is None
+        if success:
+            self.sent_log.record(email)
+        else:
+            self.log(f"❌ Failed to send email to {email}: {error}", 'error')
+        with self.lock:
+            self.counts['sent' if success else 'failed'] += 1
+            self.progress(self.counts['sent'] + self.counts['failed'])
+        if self.failures.record(success) and not self.stopped():
+            self.stop(f"Stopping campaign: more than a third of the last {FAILURE_WINDOW} sends failed")
+        return success
+
+    def finish(self, read_all):
+        """Forget the campaign's sends once every contact was handled, so a rerun starts over"""
+        if read_all and not self.stopped():
+            self.sent_log.clear()
+
+def base64_part(content_type, payload):
+    """A MIMEPart carrying ``payload``, text already encoded by base64_lines"""
+    part = MIMEPart(policy=MESSAGE_POLICY)
+    part['Content-Type'] = content_type
+    part['Content-Transfer-Encoding'] = 'base64'
+    part.set_payload(payload)
+    return part
+
+def build_parts(attachments=None, embedded_images=None):
+    """Read and encode embedded images and attachments into MIME parts, shared by every message of a campaign"""
+    parts = []
+    
+    # Add embedded images if provided. Missing files are skipped: opening them
+    # is the only check, so each file costs no extra stat() call.
+    for image_path in embedded_images or []:
+        filename = os.path.basename(image_path)
+        try:
+            with open(image_path, "rb") as image_file:
+                image_data = image_file.read()
+            
+            # Determine image type from file extension
+            image_subtype = IMAGE_SUBTYPES.get(os.path.splitext(filename)[1].lower())
+            content_type = f'image/{image_subtype}' if image_subtype else 'application/octet-stream'
+            image = base64_part(content_type, base64_lines(image_data))
+            
+            image['Content-ID'] = f'<{filename}>'
+            parts.append(image)
+            logger.info("✅ Embedded image: %s", filename)
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            logger.error("❌ Error embedding image %s: %s", image_path, e)
+    
+    # Add attachments if provided
+    for attachment_path in attachments or []:
+        filename = os.path.basename(attachment_path)
+        try:
+            # Set proper MIME type based on file extension
+            file_ext = os.path.splitext(filename)[1].lower()
+            maintype, subtype = ATTACHMENT_TYPES.get(file_ext, ('application', 'octet-stream'))
+            part = base64_part(f'{maintype}/{subtype}', base64_file(attachment_path))
+            part.add_header('Content-Disposition', 'attachment', filename=filename)
+            parts.append(part)
+            logger.info("✅ Attached: %s", filename)
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            logger.error("❌ Error attaching %s: %s", attachment_path, e)
+    
+    return parts
+
+def build_message(to_email, subject, body, sender_email, attachments=None, html_body=None, embedded_images=None, parts=None,
+                  related=False):
+    """Build the EmailMessage for one recipient; ``parts`` from build_parts, ``related`` forces multipart/related"""
+    # Create message
+    msg = EmailMessage(policy=MESSAGE_POLICY)
+    msg['From'] = sender_email
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    
+    if parts is None:
+        parts = build_parts(attachments, embedded_images)
+    related = related or bool(parts)
+    
+    # Plain text body, with the HTML body as its alternative if provided. make_related()
+    # refuses to wrap a multipart/alternative, so under multipart/related it is its own part.
+    content = MIMEPart(policy=MESSAGE_POLICY) if related else msg
+    content.set_content(body)
+    if html_body:
+        content.add_alternative(html_body, subtype='html')
+    
+    # Add embedded images and attachments alongside the body
+    if related:
+        msg['MIME-Version'] = '1.0'
+        msg.make_related()
+        msg.attach(content)
+        for part in parts:
+            msg.attach(part)
+    
+    return msg
+
+# Shared parts serialized once: the multipart boundary to use and each part's wire bytes
+PreparedParts = namedtuple("PreparedParts", "boundary texts")
+
+def _make_boundary(texts):
+    """A multipart boundary (in the stdlib generator's format) that appears in none of ``texts``"""
+    while True:
+        boundary = '=' * 15 + f'{random.randrange(sys.maxsize):019d}' + '=='
+        marker = boundary.encode('ascii')
+        if not any(marker in text for text in texts):
+            return boundary
+
+def prepare_parts(parts):
+    """Serialize build_parts output once for build_message_text"""
+    texts = tuple(part.as_bytes() for part in parts)
+    return PreparedParts(_make_boundary(texts), texts)
+
+def build_message_text(to_email, subject, body, sender_email, html_body=None, prepared=None):
+    """build_message(...).as_bytes() with the shared parts spliced in from prepare_parts"""
+    if prepared is None or not prepared.texts:
+        return build_message(to_email, subject, body, sender_email, html_body=html_body, parts=[]).as_bytes()
+    msg = build_message(to_email, subject, body, sender_email, html_body=html_body, parts=[], related=True)
+    boundary = prepared.boundary
+    msg.set_boundary(boundary)
+    text = msg.as_bytes()
+    # The boundary belongs in the header, the opening and the closing delimiter only
+    if text.count(boundary.encode('ascii')) != 3:
+        # Personalized content happens to contain the campaign boundary; use a fresh one
+        boundary = _make_boundary(prepared.texts + (text,))
+        msg.set_boundary(boundary)
+        text = msg.as_bytes()
+    delimiter = b'\r\n--' + boundary.encode('ascii')
+    closing = delimiter + b'--\r\n'
+    # The message ends with the closing delimiter after its only (text/HTML) part
+    return b''.join([text[:-len(closing)]] + [delimiter + b'\r\n' + part for part in prepared.texts] + [closing])
+
+def send_email_smtp(to_email, subject, body, sender_email, sender_password, attachments=None, html_body=None, embedded_images=None, smtp=None,
+                    parts=None, prepared=None):
+    """Send email using SMTP, over ``smtp`` if given, with parts from build_parts or prepare_parts"""
     try:
-        # Create message
-        msg = MIMEMultipart('related')
-        msg['From'] = sender_email
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        
-        # Create alternative part for HTML and plain text
-        msg_alternative = MIMEMultipart('alternative')
-        msg.attach(msg_alternative)
-        
-        # Add plain text body
-        msg_alternative.attach(MIMEText(body, 'plain'))
-        
-        # Add HTML body if provided
-        if html_body:
-            msg_alternative.attach(MIMEText(html_body, 'html'))
-        
-        # Add embedded images if provided
-        if embedded_images:
-            for image_path in embedded_images:
-                if os.path.exists(image_path):
-                    try:
-                        with open(image_path, "rb") as image_file:
-                            image_data = image_file.read()
-                        
-                        # Determine image type from file extension
-                        image_ext = os.path.splitext(image_path)[1].lower()
-                        if image_ext in ['.jpg', '.jpeg']:
-                            image = MIMEImage(image_data, _subtype='jpeg')
-                        elif image_ext == '.png':
-                            image = MIMEImage(image_data, _subtype='png')
-                        elif image_ext == '.gif':
-                            image = MIMEImage(image_data, _subtype='gif')
-                        else:
-                            image = MIMEImage(image_data)
-                        
-                        image.add_header('Content-ID', f'<{os.path.basename(image_path)}>')
-                        msg.attach(image)
-                        print(f"✅ Embedded image: {os.path.basename(image_path)}")
-                    except Exception as e:
-                        print(f"❌ Error embedding image {image_path}: {e}")
-        
-        # Add attachments if provided
-        if attachments:
-            for attachment_path in attachments:
-                if os.path.exists(attachment_path):
-                    try:
-                        with open(attachment_path, "rb") as attachment:
-                            part = MIMEBase('application', 'octet-stream')
-                            part.set_payload(attachment.read())
-                        
-                        encoders.encode_base64(part)
-                        
-                        # Set proper MIME type based on file extension
-                        file_ext = os.path.splitext(attachment_path)[1].lower()
-                        if file_ext == '.pdf':
-                            part.add_header('Content-Type', 'application/pdf')
-                        elif file_ext in ['.doc', '.docx']:
-                            part.add_header('Content-Type', 'application/msword' if file_ext == '.doc' else 'application/vnd.openxmlformats-officedocument.wordprocessingml.document')
-                        elif file_ext == '.zip':
-                            part.add_header('Content-Type', 'application/zip')
-                        elif file_ext == '.rar':
-                            part.add_header('Content-Type', 'application/x-rar-compressed')
-                        elif file_ext == '.7z':
-                            part.add_header('Content-Type', 'application/x-7z-compressed')
-                        elif file_ext in ['.xls', '.xlsx']:
-                            part.add_header('Content-Type', 'application/vnd.ms-excel' if file_ext == '.xls' else 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-                        elif file_ext == '.txt':
-                            part.add_header('Content-Type', 'text/plain')
-                        
-                        part.add_header(
-                            'Content-Disposition',
-                            f'attachment; filename= {os.path.basename(attachment_path)}'
-                        )
-                        msg.attach(part)
-                        print(f"✅ Attached: {os.path.basename(attachment_path)}")
-                    except Exception as e:
-                        print(f"❌ Error attaching {attachment_path}: {e}")
-        
-        # Create SMTP session
-        server = smtplib.SMTP('smtp.gmail.com', 587)
-        server.starttls()
-        
-        # Login
-        server.login(sender_email, sender_password)
+        if prepared is not None:
+            text = build_message_text(to_email, subject, body, sender_email, html_body, prepared)
+        else:
+            msg = build_message(to_email, subject, body, sender_email, attachments, html_body, embedded_images, parts)
+            text = msg.as_bytes()
         
-        # Send email
-        text = msg.as_string()
-        server.sendmail(sender_email, to_email, text)
-        server.quit()
+        if smtp is not None:
+            # Reuse the caller's persistent connection
+            smtp.sendmail(sender_email, to_email, text)
+        else:
+            # One-off session: closed even if the send fails, with the same retries as pooled sends
+            with SMTPSession(sender_email, sender_password) as session:
+                session.sendmail(sender_email, to_email, text)
         
-        print(f"✅ Email sent to {to_email}")
+        logger.debug("Email sent to %s", to_email)
         return True
         
     except Exception as e:
-        print(f"❌ Failed to send email to {to_email}: {e}")
+        logger.error("❌ Failed to send email to %s: %s", to_email, e)
         return False
 
-def send_bulk_emails_smtp(csv_file, template_name="kirby_partnership", sender_password=""):
-    """Send bulk emails using SMTP"""
+def iter_contacts(file):
+    """Yield (email, name, store_name) tuples from an open contacts CSV, with CONTACT_COLUMNS defaults"""
+    reader = csv.reader(file)
+    header = next(reader, [])
+    columns = [(header.index(column) if column in header else None, default) for column, default in CONTACT_COLUMNS]
+    for row in reader:
+        if not row:
+            continue  # Blank line
+        yield tuple((row[index] if index is not None and index < len(row) else default).strip()
+                    for index, default in columns)
+
+def unique_valid_contacts(contacts, skipped, rejected=None):
+    """Drop malformed and repeated emails, counting them in ``skipped`` and adding them to ``rejected``"""
+    seen = set()
+    for contact in contacts:
+        email = contact[0]
+        if not EMAIL_RE.match(email):
+            skipped['invalid'] += 1
+            if rejected is not None:
+                rejected.append(contact + ('Invalid email address',))
+            continue
+        key = email.lower()
+        if key in seen:
+            skipped['duplicate'] += 1
+            if rejected is not None:
+                rejected.append(contact + ('Duplicate email address',))
+            continue
+        seen.add(key)
+        yield contact
+
+def personalize(contact, template):
+    """Return (email, subject, body) for one (email, name, store_name) contact"""
+    email, name, store_name = contact
+    
+    # Create subject and body from the templates parsed once by get_template
+    context = {
+        'name': name,
+        'store_name': store_name,
+        'sender_name': GMAIL_CONFIG["sender_name"]
+    }
+    return email, template["_compiled_subject"](context), template["_compiled_template"](context)
+
+def render_message(contact, template, sender_email):
+    """Return (email, subject, wire-format message) for one (email, name, store_name) contact"""
+    email, subject, body = personalize(contact, template)
+    return email, subject, build_message(email, subject, body, sender_email).as_bytes()
+
+def open_sent_log(csv_file, template_name):
+    """SentLog for a CSV/template campaign, announcing how many contacts a resumed run will skip"""
+    sent_log = SentLog(f'{os.path.abspath(csv_file)}:{template_name}')
+    if sent_log:
+        logger.info("↩️  Resuming from %s: %d already sent", SENT_LOG_FILE, len(sent_log))
+    return sent_log
+
+def save_rejected(rejected):
+    """Write contacts dropped by unique_valid_contacts to a failed_emails CSV; returns its name"""
+    failed_file = f"failed_emails_{time.strftime('%Y%m%d_%H%M%S')}.csv"
+    with open(failed_file, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(FAILED_FIELDS)
+        writer.writerows(rejected)
+    return failed_file
+
+def report_summary(aborted, counts, skipped, rejected):
+    """Log the end-of-campaign counts and save the skipped contacts"""
+    logger.info("\n🛑 Campaign stopped early" if aborted else "\n🎉 Campaign completed!")
+    logger.info("   ✅ Sent: %d", counts['sent'])
+    logger.info("   ❌ Failed: %d", counts['failed'])
+    if skipped['invalid'] or skipped['duplicate']:
+        logger.info("   ⏭️  Skipped: %d invalid, %d duplicate addresses", skipped['invalid'], skipped['duplicate'])
+    if rejected:
+        logger.info("📁 Skipped contacts saved to: %s", save_rejected(rejected))
+    if skipped['sent']:
+        logger.info("   ↩️  Already sent in an earlier run: %d", skipped['sent'])
+
+def send_bulk_emails_smtp(csv_file, template_name="kirby_partnership", sender_password="",
+                          rate_per_min=CAMPAIGN_SETTINGS["rate_per_min"], burst=CAMPAIGN_SETTINGS["burst"],
+                          workers=CAMPAIGN_SETTINGS["concurrency"]):
+    """Send bulk emails using SMTP over a pool of ``workers`` persistent connections paced by one token bucket"""
     
     if not sender_password:
-        print("❌ Please provide your Gmail app password")
-        print("   Go to: https://myaccount.google.com/apppasswords")
-        print("   Generate an app password for this application")
+        logger.error("❌ Please provide your Gmail app password")
+        logger.error("   Go to: https://myaccount.google.com/apppasswords")
+        logger.error("   Generate an app password for this application")
         return
     
     # Get template
     template = get_template(template_name)
     sender_email = GMAIL_CONFIG["sender_email"]
+    workers = max(1, int(workers))
+    
+    logger.info("📧 Starting SMTP email campaign...")
+    logger.info("   Template: %s", template_name)
+    logger.info("   Sender: %s", sender_email)
+    logger.info("   File: %s", csv_file)
+    logger.info("   Connections: %s", workers)
+    logger.info("   Rate: %s/min, bursts of %s", rate_per_min, burst)
+    
+    bucket = TokenBucket(rate_per_min, burst)
+    jobs = queue.Queue(maxsize=workers * 2)
+    render = lambda contact: render_message(contact, template, sender_email)[1:]
     
-    print(f"📧 Starting SMTP email campaign...")
-    print(f"   Template: {template_name}")
-    print(f"   Sender: {sender_email}")
-    print(f"   File: {csv_file}")
+    def worker(smtp):
+        """Send queued contacts over this worker's own SMTP session until told to stop"""
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            if campaign.stopped():
+                continue  # Drain the queue without sending
+            
+            # Pace the whole pool by rate, so a slow send doesn't also pay a fixed delay
+            bucket.acquire()
+            
+            i, email, (subject, text) = job
+            logger.debug("Sending email %d to %s (subject: %s)", i, email, subject)
+            error = None
+            try:
+                smtp.sendmail(sender_email, email, text)
+                logger.debug("Email sent to %s", email)
+            except Exception as e:
+                error = e
+            campaign.record(email, error)
     
-    # Read contacts
-    contacts = []
+    # Log in once per worker up front so a bad password is reported before any contact is read
     try:
-        with open(csv_file, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            contacts = list(reader)
-    except Exception as e:
-        print(f"❌ Error reading CSV: {e}")
+        with ExitStack() as stack:
+            # Addresses a previous, interrupted run of this campaign already reached
+            sent_log = open_sent_log(csv_file, template_name)
+            stack.callback(sent_log.close)
+            campaign = Campaign(sent_log)
+            sessions = [SMTPSession(sender_email, sender_password) for _ in range(workers)]
+            for smtp in sessions:
+                stack.callback(smtp.close)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                # The pool's handshakes and logins run concurrently rather than one after another
+                list(executor.map(SMTPSession.connect, sessions))
+                futures = [executor.submit(worker, smtp) for smtp in sessions]
+                # Stream contacts from the CSV into the bounded queue, rendered
+                # here so the workers only spend their time talking to the server
+                try:
+                    with open(csv_file, 'r', encoding='utf-8', newline='') as file:
+                        contacts = unique_valid_contacts(iter_contacts(file), campaign.skipped, campaign.rejected)
+                        for job in campaign.jobs(contacts, render):
+                            jobs.put(job)
+                    read_all = True
+                except (OSError, csv.Error, UnicodeDecodeError) as e:
+                    logger.error("❌ Error reading CSV: %s", e)
+                    read_all = False
+                finally:
+                    for _ in futures:
+                        jobs.put(None)
+                for future in futures:
+                    future.result()
+            campaign.finish(read_all)
+    except (smtplib.SMTPException, OSError) as e:
+        logger.error("❌ Could not connect to %s: %s", SMTP_HOST, e)
         return
     
-    print(f"📊 Found {len(contacts)} contacts")
+    report_summary(campaign.stopped(), campaign.counts, campaign.skipped, campaign.rejected)
+
+async def send_bulk_emails_smtp_async(csv_file, template_name="kirby_partnership", sender_password="",
+                                    rate_per_min=CAMPAIGN_SETTINGS["rate_per_min"], burst=CAMPAIGN_SETTINGS["burst"],
+                                    workers=CAMPAIGN_SETTINGS["concurrency"]):
+    """asyncio version of send_bulk_emails_smtp using aiosmtplib"""
+    if not sender_password:
+        logger.error("❌ Please provide your Gmail app password")
+        return
     
-    # Send emails
-    sent_count = 0
-    failed_count = 0
+    template = get_template(template_name)
+    sender_email = GMAIL_CONFIG["sender_email"]
+    workers = max(1, int(workers))
     
-    for i, contact in enumerate(contacts, 1):
-        email = contact.get('email', '').strip()
-        name = contact.get('name', 'there').strip()
-        store_name = contact.get('store_name', 'your service center').strip()
-        
-        # Create subject and body
-        subject = template["subject"].format(store_name=store_name)
-        body = template["template"].format(
-            name=name,
-            store_name=store_name,
-            sender_name=GMAIL_CONFIG["sender_name"]
-        )
-        
-        print(f"\n📧 Sending email {i}/{len(contacts)} to {email}")
-        print(f"   Subject: {subject}")
-        
-        # Send email
-        success = send_email_smtp(email, subject, body, sender_email, sender_password)
-        
-        if success:
-            sent_count += 1
-        else:
-            failed_count += 1
-        
-        # Delay between emails
-        if i < len(contacts):
-            print("⏳ Waiting 5 seconds...")
-            time.sleep(5)
+    logger.info("📧 Starting SMTP email campaign (asyncio)...")
+    logger.info("   Template: %s", template_name)
+    logger.info("   Sender: %s", sender_email)
+    logger.info("   File: %s", csv_file)
+    logger.info("   Connections: %s", workers)
+    logger.info("   Rate: %s/min, bursts of %s", rate_per_min, burst)
+    
+    bucket = TokenBucket(rate_per_min, burst)
+    jobs = asyncio.Queue(maxsize=workers * 2)
+    render = lambda contact: render_message(contact, template, sender_email)[1:]
+    loop = asyncio.get_running_loop()
     
-    print(f"\n🎉 Campaign completed!")
-    print(f"   ✅ Sent: {sent_count}")
-    print(f"   ❌ Failed: {failed_count}")
+    async def worker(smtp):
+        """Send queued contacts over this worker's own connection until told to stop"""
+        while True:
+            job = await jobs.get()
+            if job is None:
+                return
+            if campaign.stopped():
+                continue  # Drain the queue without sending
+            
+            await bucket.acquire_async()
+            
+            i, email, (subject, text) = job
+            logger.debug("Sending email %d to %s (subject: %s)", i, email, subject)
+            error = None
+            try:
+                await smtp.sendmail(sender_email, email, text)
+                logger.debug("Email sent to %s", email)
+            except Exception as e:
+                error = e
+            # The resume log's SQLite commits would block every connection, so record off the loop
+            await loop.run_in_executor(None, campaign.record, email, error)
+    
+    async def produce():
+        """Render contacts from the CSV into the bounded queue, then stop the workers"""
+        try:
+            with open(csv_file, 'r', encoding='utf-8', newline='') as file:
+                contacts = unique_valid_contacts(iter_contacts(file), campaign.skipped, campaign.rejected)
+                for job in campaign.jobs(contacts, render):
+                    await jobs.put(job)
+            return True
+        except (OSError, csv.Error, UnicodeDecodeError) as e:
+            logger.error("❌ Error reading CSV: %s", e)
+            return False
+        finally:
+            for _ in range(workers):
+                await jobs.put(None)
+    
+    # Addresses a previous, interrupted run of this campaign already reached
+    sent_log = open_sent_log(csv_file, template_name)
+    campaign = Campaign(sent_log)
+    sessions = [AsyncSMTPSession(sender_email, sender_password) for _ in range(workers)]
+    try:
+        # Log in on every connection concurrently before any contact is read
+        await asyncio.gather(*(smtp.connect() for smtp in sessions))
+        read_all, *_ = await asyncio.gather(produce(), *(worker(smtp) for smtp in sessions))
+        await loop.run_in_executor(None, campaign.finish, read_all)
+    except (aiosmtplib.SMTPException, OSError) as e:
+        logger.error("❌ Could not connect to %s: %s", SMTP_HOST, e)
+        return
+    finally:
+        await asyncio.gather(*(smtp.close() for smtp in sessions))
+        await loop.run_in_executor(None, sent_log.close)
+    
+    report_summary(campaign.stopped(), campaign.counts, campaign.skipped, campaign.rejected)
 
 def main():
     """Main function"""
@@ -200,6 +859,8 @@ def main():
     if len(sys.argv) > 2:
         template_name = sys.argv[2]
     
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    
     # Get credentials from environment variables
     sender_password = os.getenv('GMAIL_APP_PASSWORD')
     sender_email = os.getenv('SENDER_EMAIL', GMAIL_CONFIG["sender_email"])
@@ -216,7 +877,13 @@ def main():
     print(f"   Password: {'*' * len(sender_password)}")
     print()
     
-    send_bulk_emails_smtp(csv_file, template_name, sender_password)
+    if CAMPAIGN_SETTINGS["async_send"]:
+        if aiosmtplib is None:
+            print("❌ async_send needs aiosmtplib. Run: pip install aiosmtplib")
+            return
+        asyncio.run(send_bulk_emails_smtp_async(csv_file, template_name, sender_password))
+    else:
+        send_bulk_emails_smtp(csv_file, template_name, sender_password)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file